@@ -359,6 +359,7 @@ def _write_transfer_to_db(agents, src, tgt, sku, qty):
                     "created_at": {"S": ts},
                     "completed_at": {"S": ts},
                     "initiated_by": {"S": "agentcore_orchestrator"},
+                    "version": {"N": "0"},
                 },
             }},
         ])
@@ -3,22 +3,43 @@
 6 tablo: Warehouses, Products, Inventory, SalesHistory, Transfers, AgentDecisions
 """
 import boto3
+import functools
 import json
-import time
+import mmap
 import os
+import random
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
 from botocore.exceptions import ClientError
+from boto3.dynamodb.types import TypeSerializer
 from botocore.config import Config
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # orjson opsiyonel; yoksa stdlib json
+    _json_loads = json.loads
+
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
 import env_loader
-import urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from data_layer import sales_cache
 
 
 REGION = "us-west-2"  # Bedrock'un aktif olduğu region
 BOTO_CONFIG = Config(retries={"max_attempts": 3})
 
+# Thread pool'a verilen görev başına kayıt sayısı. Her görev
+# 25'lik BatchWriteItem çağrılarına bölünür; 500 kayıt = 20 çağrı. Küçük görevler
+# thread'ler arasında yükü dengeler ve throttle olduğunda etkilenen kısmı daraltır.
+TASK_SIZE = 500
+BATCH_WRITE_LIMIT = 25  # BatchWriteItem'ın kayıt sınırı
+
+# Kayıtlar resource katmanı yerine bir kez burada serialize edilip low-level
+# client'a verilir; resource/batch_writer her istekte shape modelini yeniden dolaşır.
+_SERIALIZER = TypeSerializer()
+
 TABLE_DEFINITIONS = [
     {
         "TableName": "Warehouses",
@@ -83,6 +104,8 @@ TABLE_DEFINITIONS = [
             {"AttributeName": "transfer_id", "AttributeType": "S"},
             {"AttributeName": "status", "AttributeType": "S"},
             {"AttributeName": "created_at", "AttributeType": "S"},
+            {"AttributeName": "source_warehouse", "AttributeType": "S"},
+            {"AttributeName": "target_warehouse", "AttributeType": "S"},
         ],
         "GlobalSecondaryIndexes": [
             {
@@ -93,6 +116,22 @@ TABLE_DEFINITIONS = [
                 ],
                 "Projection": {"ProjectionType": "ALL"},
             },
+            {
+                "IndexName": "SourceWarehouseIndex",
+                "KeySchema": [
+                    {"AttributeName": "source_warehouse", "KeyType": "HASH"},
+                    {"AttributeName": "created_at", "KeyType": "RANGE"},
+                ],
+                "Projection": {"ProjectionType": "ALL"},
+            },
+            {
+                "IndexName": "TargetWarehouseIndex",
+                "KeySchema": [
+                    {"AttributeName": "target_warehouse", "KeyType": "HASH"},
+                    {"AttributeName": "created_at", "KeyType": "RANGE"},
+                ],
+                "Projection": {"ProjectionType": "ALL"},
+            },
         ],
         "BillingMode": "PAY_PER_REQUEST",
     },
@@ -113,7 +152,11 @@ TABLE_DEFINITIONS = [
                     {"AttributeName": "agent_name", "KeyType": "HASH"},
                     {"AttributeName": "timestamp", "KeyType": "RANGE"},
                 ],
-                "Projection": {"ProjectionType": "ALL"},
+                # input_data/output_data buyuk olabilir; liste gorunumu icin ozet alanlar yeter
+                "Projection": {
+                    "ProjectionType": "INCLUDE",
+                    "NonKeyAttributes": ["decision_type", "reasoning"],
+                },
             },
         ],
         "BillingMode": "PAY_PER_REQUEST",
@@ -121,15 +164,80 @@ TABLE_DEFINITIONS = [
 ]
 
 
+# Süresi dolan kayıtları DynamoDB kendisi siler (scan ile temizlik gerekmez)
+TTL_ATTRIBUTES = {
+    "AgentDecisions": "ttl_expire_at",
+}
+
+
+def enable_ttl(dynamodb, table_name: str, attribute: str):
+    """Tabloda TTL kapalıysa verilen epoch-saniye attribute'u ile açar."""
+    desc = dynamodb.describe_time_to_live(TableName=table_name)["TimeToLiveDescription"]
+    if desc.get("TimeToLiveStatus") in ("ENABLED", "ENABLING"):
+        return
+    dynamodb.update_time_to_live(
+        TableName=table_name,
+        TimeToLiveSpecification={"Enabled": True, "AttributeName": attribute},
+    )
+    print(f"  ⏱️  {table_name} TTL açıldı ({attribute})")
+
+
+def _wait_index_active(dynamodb, table_name: str, index_name: str, delay: int = 5):
+    """GSI backfill'i bitip index ACTIVE olana kadar bekler."""
+    while True:
+        table = dynamodb.describe_table(TableName=table_name)["Table"]
+        status = next((g.get("IndexStatus") for g in table.get("GlobalSecondaryIndexes", [])
+                       if g["IndexName"] == index_name), None)
+        if status == "ACTIVE":
+            return
+        time.sleep(delay)
+
+
+def _projection_key(projection: dict) -> tuple:
+    return projection.get("ProjectionType"), frozenset(projection.get("NonKeyAttributes", ()))
+
+
+def ensure_indexes(dynamodb, table_def: dict):
+    """Mevcut tabloda tanımda olup eksik olan GSI'ları ekler.
+
+    create_table sadece yeni tablolarda çalışır; GSI'lar sonradan eklendiyse eski
+    kurulumlar bu adımla güncellenir. UpdateTable çağrısı başına tek GSI oluşturulabildiği
+    için index'ler sırayla eklenir ve her biri ACTIVE olana kadar beklenir.
+    """
+    table_name = table_def["TableName"]
+    table = dynamodb.describe_table(TableName=table_name)["Table"]
+    existing = {g["IndexName"]: g for g in table.get("GlobalSecondaryIndexes", [])}
+    attr_defs = {a["AttributeName"]: a for a in table_def["AttributeDefinitions"]}
+
+    for gsi in table_def.get("GlobalSecondaryIndexes", []):
+        current = existing.get(gsi["IndexName"])
+        if current is not None:
+            # Projection UpdateTable ile değiştirilemez; index silinip setup tekrar çalıştırılmalı
+            if _projection_key(current["Projection"]) != _projection_key(gsi["Projection"]):
+                print(f"  ⚠️  {table_name}: {gsi['IndexName']} projection'ı tanımdan farklı "
+                      f"({current['Projection'].get('ProjectionType')}); CONNECTION_GUIDE'daki "
+                      f"migration adımına bakın")
+            continue
+        print(f"  🔨 {table_name}: {gsi['IndexName']} GSI ekleniyor...")
+        dynamodb.update_table(
+            TableName=table_name,
+            AttributeDefinitions=[attr_defs[k["AttributeName"]] for k in gsi["KeySchema"]],
+            GlobalSecondaryIndexUpdates=[{"Create": gsi}],
+        )
+        _wait_index_active(dynamodb, table_name, gsi["IndexName"])
+        print(f"  ✓  {table_name}: {gsi['IndexName']} eklendi")
+
+
 def create_tables(region: str = REGION):
     """Tüm DynamoDB tablolarını oluşturur."""
-    dynamodb = boto3.client("dynamodb", region_name=region, verify=False)
+    dynamodb = boto3.client("dynamodb", region_name=region, verify=env_loader.VERIFY)
 
     for table_def in TABLE_DEFINITIONS:
         table_name = table_def["TableName"]
         try:
             dynamodb.describe_table(TableName=table_name)
             print(f"  ⏭️  {table_name} zaten mevcut, atlanıyor")
+            ensure_indexes(dynamodb, table_def)
         except ClientError as e:
             if e.response["Error"]["Code"] == "ResourceNotFoundException":
                 print(f"  🔨 {table_name} oluşturuluyor...")
@@ -141,55 +249,140 @@ def create_tables(region: str = REGION):
             else:
                 raise
 
+        if table_name in TTL_ATTRIBUTES:
+            enable_ttl(dynamodb, table_name, TTL_ATTRIBUTES[table_name])
 
-def load_data_to_table(table_name: str, data: list, region: str = REGION, threads: int = 10):
-    """JSON verisini DynamoDB tablosuna yükler (paralel batch write)."""
-    from decimal import Decimal
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    import threading
-
-    def convert_floats(obj):
-        if isinstance(obj, float):
-            return Decimal(str(obj))
-        if isinstance(obj, dict):
-            return {k: convert_floats(v) for k, v in obj.items()}
-        if isinstance(obj, list):
-            return [convert_floats(i) for i in obj]
-        return obj
 
+def convert_floats(obj):
+    """float değerleri DynamoDB'nin kabul ettiği Decimal'e çevirir (iç içe yapılar dahil)."""
+    if isinstance(obj, float):
+        return _float_to_decimal(obj)
+    if isinstance(obj, dict):
+        return {k: convert_floats(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [convert_floats(i) for i in obj]
+    return obj
+
+
+FLOAT_DECIMAL_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=FLOAT_DECIMAL_CACHE_SIZE)
+def _float_to_decimal(value: float) -> Decimal:
+    # Satış verisinde aynı fiyat/miktar değerleri çok tekrarlanır; Decimal immutable.
+    # Cache sınırlı: toplu yüklemede her farklı float bellekte kalmasın
+    return Decimal(str(value))
+
+
+def serialize_item(item: dict) -> dict:
+    """Python dict'ini DynamoDB attribute-value formatına çevirir ({"S": ...}, {"N": ...})."""
+    return {k: _SERIALIZER.serialize(v) for k, v in item.items()}
+
+
+def batch_write_serialized(client, table_name: str, items: list) -> int:
+    """Önceden serialize edilmiş kayıtları 25'lik BatchWriteItem çağrılarıyla yazar.
+
+    UnprocessedItems jitter'lı üstel bekleme ile tekrar denenir (MCP server'larındaki
+    BatchGetItem yardımcısıyla aynı aralık). Yazılan kayıt sayısını döner.
+    """
+    for i in range(0, len(items), BATCH_WRITE_LIMIT):
+        requests = [{"PutRequest": {"Item": item}} for item in items[i:i + BATCH_WRITE_LIMIT]]
+        delay = 0.05
+        while requests:
+            resp = client.batch_write_item(RequestItems={table_name: requests})
+            requests = resp.get("UnprocessedItems", {}).get(table_name, [])
+            if requests:
+                time.sleep(random.uniform(delay / 2, delay))
+                delay = min(delay * 2, 2.0)
+    return len(items)
+
+
+def _upload_chunk(client, table_name: str, chunk: list) -> int:
+    """Bir chunk'ı serialize edip low-level client ile yükler."""
+    return batch_write_serialized(client, table_name, [serialize_item(item) for item in chunk])
+
+
+def load_data_to_table(table_name: str, data: list, region: str = REGION, threads: int = 10,
+                       task_size: int = TASK_SIZE):
+    """JSON verisini DynamoDB tablosuna yükler (paralel batch write)."""
     data = convert_floats(data)
     total = len(data)
-    counter = {"done": 0}
-    lock = threading.Lock()
-
-    def upload_chunk(chunk):
-        """Bir chunk'ı batch write ile yükler."""
-        dynamodb = boto3.resource("dynamodb", region_name=region, verify=False)
-        table = dynamodb.Table(table_name)
-        with table.batch_writer() as batch:
-            for item in chunk:
-                batch.put_item(Item=item)
-        with lock:
-            counter["done"] += len(chunk)
-            done = counter["done"]
-        if done % 10000 < len(chunk):
-            print(f"    ... {done}/{total} yüklendi")
-
-    # 10K'lık chunk'lara böl
-    chunk_size = 10000
-    chunks = [data[i:i + chunk_size] for i in range(0, total, chunk_size)]
 
+    # Tek client tüm thread'lerce paylaşılır (boto3 client'ları thread-safe)
+    client = boto3.client(
+        "dynamodb", region_name=region, verify=env_loader.VERIFY,
+        config=BOTO_CONFIG.merge(Config(max_pool_connections=threads)),
+    )
+
+    # task_size'lık görevlere böl (196K kayıt ≈ 400 görev)
+    chunks = [data[i:i + task_size] for i in range(0, total, task_size)]
+    upload = functools.partial(_upload_chunk, client, table_name)
+
+    done = 0
     with ThreadPoolExecutor(max_workers=threads) as executor:
-        futures = [executor.submit(upload_chunk, chunk) for chunk in chunks]
-        for future in as_completed(futures):
-            future.result()  # hata varsa raise eder
+        # map sonuçları sırayla döner; hata varsa burada raise eder
+        for count in executor.map(upload, chunks):
+            done += count
+            if done % 10000 < count:
+                print(f"    ... {done}/{total} yüklendi")
 
     print(f"  ✓  {table_name}: {total} kayıt yüklendi ({threads} thread)")
 
 
+def _line_offsets(mm: mmap.mmap) -> list:
+    """Her satırın başlangıç offset'ini döner; son eleman dosya sonudur."""
+    offsets = [0]
+    pos = mm.find(b"\n")
+    while pos != -1:
+        offsets.append(pos + 1)
+        pos = mm.find(b"\n", pos + 1)
+    if offsets[-1] != len(mm):
+        offsets.append(len(mm))  # sonda newline olmayan satır
+    return offsets
+
+
+def _upload_ddbjson_range(client, table_name: str, mm: mmap.mmap, span: tuple) -> int:
+    """mmap'teki [start, end) aralığındaki DynamoDB JSON satırlarını parse edip yükler."""
+    start, end = span
+    items = [_json_loads(line) for line in mm[start:end].splitlines() if line]
+    return batch_write_serialized(client, table_name, items)
+
+
+def load_ddbjson_to_table(table_name: str, path: str, region: str = REGION, threads: int = 10,
+                          task_size: int = TASK_SIZE):
+    """prebuild_ddb_json ile üretilmiş satır bazlı DynamoDB JSON dosyasını yükler.
+
+    Kayıtlar zaten attribute-value formatında olduğu için convert_floats/serialize
+    adımları atlanır. Dosya mmap ile açılır; ana thread yalnızca satır offset'lerini
+    çıkarır, her görev kendi byte aralığını parse eder.
+    """
+    client = boto3.client(
+        "dynamodb", region_name=region, verify=env_loader.VERIFY,
+        config=BOTO_CONFIG.merge(Config(max_pool_connections=threads)),
+    )
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        offsets = _line_offsets(mm)
+        total = len(offsets) - 1
+        spans = [
+            (offsets[i], offsets[min(i + task_size, total)])
+            for i in range(0, total, task_size)
+        ]
+        upload = functools.partial(_upload_ddbjson_range, client, table_name, mm)
+
+        done = 0
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for count in executor.map(upload, spans):
+                done += count
+                if done % 10000 < count:
+                    print(f"    ... {done}/{total} yüklendi")
+
+    print(f"  ✓  {table_name}: {total} kayıt yüklendi ({threads} thread, ddbjson)")
+
+
 def _table_has_data(table_name: str, region: str = REGION) -> bool:
     """Tabloda veri var mı kontrol eder (hızlı scan, 1 item)."""
-    dynamodb = boto3.client("dynamodb", region_name=region, verify=False)
+    dynamodb = boto3.client("dynamodb", region_name=region, verify=env_loader.VERIFY)
     resp = dynamodb.scan(TableName=table_name, Limit=1, Select="COUNT")
     return resp.get("Count", 0) > 0
 
@@ -226,13 +419,14 @@ def load_all_data(data_dir: str = "data_layer/data", region: str = REGION):
         print("  ⏳ SalesHistory yükleniyor (196K+ kayıt, paralel yükleme)...")
         with open(f"{data_dir}/sales-history.json", "r", encoding="utf-8") as f:
             load_data_to_table("SalesHistory", json.load(f), region)
+        sales_cache.bump_version()
 
     print("\n✅ Tüm veriler DynamoDB'ye yüklendi!")
 
 
 def delete_tables(region: str = REGION):
     """Tüm tabloları siler (dikkatli kullan)."""
-    dynamodb = boto3.client("dynamodb", region_name=region, verify=False)
+    dynamodb = boto3.client("dynamodb", region_name=region, verify=env_loader.VERIFY)
     for table_def in TABLE_DEFINITIONS:
         table_name = table_def["TableName"]
         try:
@@ -0,0 +1,65 @@
+"""analytics_server'in kapanmis ay satislari icin disk cache'i: dizin ve versiyon.
+
+analytics_server girdileri yazar/okur, SalesHistory'yi yeniden yukleyen scriptler
+(reload_sales, setup_aws) bump_version() ile gecersiz kilar. Dizin ve VERSION dosya
+adi sadece burada tanimlidir; iki taraf ayni yeri okur.
+
+Girdiler versiyon basina ayri alt dizinde tutulur (SALES_CACHE_DIR/v-<versiyon>/).
+Versiyon degisince eski alt dizinler silinir, temp dizininde dosya birikmez.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+SALES_CACHE_DIR = os.environ.get("SALES_CACHE_DIR", os.path.join(tempfile.gettempdir(), "sales_cache"))
+VERSION_FILE = "VERSION"
+_VERSION_DIR_PREFIX = "v-"
+
+
+def read_version() -> str:
+    """Gecerli cache versiyonu; VERSION dosyasi yoksa bos string."""
+    try:
+        with open(os.path.join(SALES_CACHE_DIR, VERSION_FILE), encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def version_dir(version: str) -> str:
+    """Verilen versiyonun girdilerinin tutuldugu alt dizin."""
+    return os.path.join(SALES_CACHE_DIR, _VERSION_DIR_PREFIX + (version or "0"))
+
+
+def bump_version():
+    """Cache'i gecersiz kilar: yeni versiyon yazar, eski versiyonlarin girdilerini siler."""
+    version = str(time.time_ns())
+    try:
+        os.makedirs(SALES_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=SALES_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(SALES_CACHE_DIR, VERSION_FILE))
+    except OSError as e:
+        print(f"  ⚠️  Satış cache versiyonu güncellenemedi ({SALES_CACHE_DIR}): {e}")
+        return
+
+    # Eski versiyon dizinleri ve onceki duz (versiyonsuz) yerlesimden kalan .json dosyalari.
+    # Silme sirasinda eski versiyonla yazan bir proses dizini yeniden olusturabilir;
+    # o dizin hic okunmaz ve bir sonraki bump'ta silinir.
+    keep = os.path.basename(version_dir(version))
+    try:
+        entries = list(os.scandir(SALES_CACHE_DIR))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.name in (VERSION_FILE, keep):
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name.startswith(_VERSION_DIR_PREFIX):
+                shutil.rmtree(entry.path, ignore_errors=True)
+        elif entry.name.endswith(".json"):
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
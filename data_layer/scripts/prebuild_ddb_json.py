@@ -0,0 +1,44 @@
+"""sales-history.json'u bir kez DynamoDB JSON formatına çevirir.
+
+Her satır bir kaydın attribute-value halidir ({"S": ...}, {"N": ...}).
+reload_sales bu dosya varsa dönüşüm yapmadan doğrudan BatchWriteItem'a verir.
+
+Kullanim:
+    python -m data_layer.scripts.prebuild_ddb_json
+"""
+import sys
+import os
+import json
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from data_layer.infrastructure.dynamodb_setup import convert_floats, serialize_item
+
+DATA_DIR = "data_layer/data"
+SOURCE_PATH = os.path.join(DATA_DIR, "sales-history.json")
+DDBJSON_PATH = os.path.join(DATA_DIR, "sales-history.ddbjson")
+
+
+def build(source_path: str = SOURCE_PATH, target_path: str = DDBJSON_PATH) -> int:
+    """JSON listesini satır başına bir kayıt olacak şekilde DynamoDB JSON'a yazar."""
+    with open(source_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    # Yarım kalan dosya reload_sales tarafından okunmasın diye önce tmp'ye yaz
+    tmp_path = target_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        for record in data:
+            item = serialize_item(convert_floats(record))
+            out.write(json.dumps(item, separators=(",", ":")))
+            out.write("\n")
+    os.replace(tmp_path, target_path)
+    return len(data)
+
+
+def main():
+    print(f"Donusturuluyor: {SOURCE_PATH} -> {DDBJSON_PATH}")
+    count = build()
+    print(f"TAMAMLANDI: {count} kayit yazildi")
+
+
+if __name__ == "__main__":
+    main()
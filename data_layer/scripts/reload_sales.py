@@ -1,8 +1,12 @@
 """Eksik SalesHistory kayitlarini tamamlar.
 
-batch_writer + put_item idempotent oldugu icin tum veriyi tekrar yukler.
+BatchWriteItem (PutRequest) idempotent oldugu icin tum veriyi tekrar yukler.
 Zaten var olan kayitlar uzerine yazilir, eksikler eklenir.
 
+sales-history.ddbjson varsa (prebuild_ddb_json ile uretilir) JSON parse ve
+donusum adimlari atlanir. sales-history.json ddbjson'dan yeniyse (veri yeniden
+uretilmis) ddbjson once yeniden olusturulur; eski veri yuklenmez.
+
 Kullanim:
     python -m data_layer.scripts.reload_sales
 """
@@ -11,10 +15,10 @@ import os
 import json
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
 import env_loader
-import urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-from data_layer.infrastructure.dynamodb_setup import load_data_to_table
+from data_layer import sales_cache
+from data_layer.infrastructure.dynamodb_setup import load_data_to_table, load_ddbjson_to_table
+from data_layer.scripts import prebuild_ddb_json
 
 REGION = "us-west-2"
 DATA_DIR = "data_layer/data"
@@ -23,20 +27,37 @@ DATA_DIR = "data_layer/data"
 def main():
     region = os.environ.get("AWS_DEFAULT_REGION", REGION)
     sales_path = os.path.join(DATA_DIR, "sales-history.json")
+    ddbjson_path = os.path.join(DATA_DIR, "sales-history.ddbjson")
 
     print("=" * 50)
     print("SalesHistory Eksik Kayit Tamamlama")
     print(f"Region: {region}")
     print("=" * 50)
 
-    print(f"\nJSON dosyasi yukleniyor: {sales_path}")
-    with open(sales_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    print(f"Toplam kayit: {len(data)}")
+    if os.path.exists(ddbjson_path) and os.path.exists(sales_path) \
+            and os.path.getmtime(sales_path) > os.path.getmtime(ddbjson_path):
+        print(f"\n{sales_path} {ddbjson_path} dosyasindan yeni; ddbjson yeniden olusturuluyor...")
+        count = prebuild_ddb_json.build(sales_path, ddbjson_path)
+        print(f"  {count} kayit donusturuldu")
+
+    if os.path.exists(ddbjson_path):
+        print(f"\nOnceden donusturulmus dosya kullaniliyor: {ddbjson_path}")
+        print(f"\nSalesHistory tablosuna yukleniyor (put_item, var olanlar uzerine yazilir)...")
+        print("Bu islem birkac dakika surebilir...\n")
+        load_ddbjson_to_table("SalesHistory", ddbjson_path, region, threads=10)
+    else:
+        print(f"\nJSON dosyasi yukleniyor: {sales_path}")
+        print("  (ipucu: 'python -m data_layer.scripts.prebuild_ddb_json' ile donusumu bir kez yapin)")
+        with open(sales_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        print(f"Toplam kayit: {len(data)}")
+
+        print(f"\nSalesHistory tablosuna yukleniyor (put_item, var olanlar uzerine yazilir)...")
+        print("Bu islem birkac dakika surebilir...\n")
+        load_data_to_table("SalesHistory", data, region, threads=10)
 
-    print(f"\nSalesHistory tablosuna yukleniyor (put_item, var olanlar uzerine yazilir)...")
-    print("Bu islem birkac dakika surebilir...\n")
-    load_data_to_table("SalesHistory", data, region, threads=10)
+    # analytics_server'in disk cache'indeki kapanmis ay satislari artik eski
+    sales_cache.bump_version()
 
     print("\n" + "=" * 50)
     print("TAMAMLANDI! Dogrulamak icin:")
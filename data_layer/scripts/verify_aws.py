@@ -1,24 +1,40 @@
 """AWS altyapisini dogrular - tablolar dolu mu, S3 dosyalari var mi kontrol eder.
 
-Gercek kayit sayisi icin full scan yapar (describe_table ItemCount yaklasiktir).
+Once describe_table ItemCount'a bakar; beklenenle %2 icinde eslesiyorsa scan
+yapmaz. Aksi halde gercek kayit sayisi icin paralel full scan yapar
+(ItemCount yaklasiktir, DynamoDB yaklasik 6 saatte bir gunceller).
 
 Kullanim:
     python -m data_layer.scripts.verify_aws
+    python -m data_layer.scripts.verify_aws --full    # Her tabloyu full scan ile say
     python -m data_layer.scripts.verify_aws --quick   # Eski hizli mod (yaklasik)
 """
 import sys
 import os
+import functools
+import io
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
 import env_loader
-import urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-import boto3
 from botocore.exceptions import ClientError
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # orjson opsiyonel; yoksa stdlib json
+    _json_loads = json.loads
+
 REGION = "us-west-2"
 DATA_DIR = "data_layer/data"
+SCAN_SEGMENTS = 8  # paralel scan segment (thread) sayisi
+ITEM_COUNT_TOLERANCE = 0.02  # ItemCount bu oranda eslesiyorsa scan atlanir
+FLUSH_INTERVAL = 0.5  # saniye; ilerleme ciktisi icin flush araligi
+
+_CLIENT_LOCK = threading.Lock()
 
 EXPECTED_TABLES = {
     "Warehouses": 6,
@@ -40,17 +56,56 @@ EXPECTED_S3_FILES = [
 ]
 
 
-def _count_table_items(dynamodb_client, table_name):
-    """Tablodaki gercek kayit sayisini full scan ile sayar."""
-    total = 0
-    params = {"TableName": table_name, "Select": "COUNT"}
-    while True:
-        resp = dynamodb_client.scan(**params)
-        total += resp["Count"]
-        if "LastEvaluatedKey" not in resp:
-            break
-        params["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
-    return total
+def _count_segment(client_factory, table_name, segment, total_segments, page_size=None):
+    """Tek bir paralel scan segmentindeki kayitlari sayar.
+
+    page_size verilmezse DynamoDB her sayfada 1MB'a kadar kayit degerlendirir;
+    kucuk kayitlarda bu 1000'den cok daha fazla kayit/sayfa demektir.
+    """
+    client = client_factory()
+    pagination = {"PageSize": page_size} if page_size else {}
+    pages = client.get_paginator("scan").paginate(
+        TableName=table_name,
+        Select="COUNT",
+        Segment=segment,
+        TotalSegments=total_segments,
+        PaginationConfig=pagination,
+    )
+    return sum(page["Count"] for page in pages)
+
+
+def _count_table_items(client_factory, table_name, total_segments=SCAN_SEGMENTS):
+    """Tablodaki gercek kayit sayisini paralel (Segment/TotalSegments) full scan ile sayar.
+
+    client_factory her thread icin ayri bir DynamoDB client'i dondurmelidir.
+    """
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        counts = executor.map(
+            lambda seg: _count_segment(client_factory, table_name, seg, total_segments),
+            range(total_segments),
+        )
+        return sum(counts)
+
+
+def _client(service, region):
+    """Ortak session'dan client uretir; paralel thread'lerden cagrilabilir."""
+    with _CLIENT_LOCK:  # boto3 Session.client() thread-safe degil
+        return env_loader.get_session().client(service, region_name=region, verify=env_loader.VERIFY, config=env_loader.get_boto_config())
+
+
+# Kayitlari ic ice obje icermeyen duz liste olan dosyalar; kayit sayisi
+# JSON parse etmeden '{' sayilarak bulunabilir
+FLAT_JSON_FILES = {"sales-history.json"}
+
+
+@functools.lru_cache(maxsize=8)
+def _json_len(path):
+    """JSON listesindeki kayit sayisini dondurur (dosya basina bir kez hesaplanir)."""
+    if os.path.basename(path) in FLAT_JSON_FILES:
+        with open(path, "rb") as f:
+            return sum(block.count(b"{") for block in iter(lambda: f.read(1 << 20), b""))
+    with open(path, "rb") as f:
+        return len(_json_loads(f.read()))
 
 
 def _load_expected_count(table_name):
@@ -66,21 +121,35 @@ def _load_expected_count(table_name):
     path = os.path.join(DATA_DIR, file_map[table_name])
     if not os.path.exists(path):
         return EXPECTED_TABLES.get(table_name, 0)
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return len(data)
+    return _json_len(path)
+
+
+_LAST_FLUSH = [0.0]
 
 
-def verify_dynamodb(region=REGION, quick=False):
-    """DynamoDB tablolarini kontrol eder."""
-    dynamodb = boto3.client("dynamodb", region_name=region, verify=False)
+def _tick(msg, force=False):
+    """Ilerleme satirini yazar; stdout'u en fazla FLUSH_INTERVAL'da bir flush eder."""
+    sys.stdout.write(msg)
+    now = time.monotonic()
+    if force or now - _LAST_FLUSH[0] > FLUSH_INTERVAL:
+        sys.stdout.flush()
+        _LAST_FLUSH[0] = now
+
+
+def verify_dynamodb(region=REGION, quick=False, full=False):
+    """DynamoDB tablolarini kontrol eder.
+
+    full=False iken ItemCount beklenene yeterince yakinsa full scan atlanir.
+    """
+    dynamodb = _client("dynamodb", region)
+    client_factory = functools.partial(_client, "dynamodb", region)
     all_ok = True
 
     if quick:
-        print("\n--- DynamoDB Dogrulama (HIZLI / yaklasik) ---\n", flush=True)
+        _tick("\n--- DynamoDB Dogrulama (HIZLI / yaklasik) ---\n\n")
     else:
-        print("\n--- DynamoDB Dogrulama (GERCEK SAYIM) ---\n", flush=True)
-        print("  (SalesHistory icin bu islem 1-2 dakika surebilir)\n", flush=True)
+        _tick("\n--- DynamoDB Dogrulama (GERCEK SAYIM) ---\n\n")
+        _tick("  (scan gerekirse SalesHistory icin bu islem 1-2 dakika surebilir)\n\n")
 
     for table_name, default_min in EXPECTED_TABLES.items():
         try:
@@ -88,87 +157,115 @@ def verify_dynamodb(region=REGION, quick=False):
             status = resp["Table"]["TableStatus"]
 
             if status != "ACTIVE":
-                print(f"  FAIL {table_name}: status={status}", flush=True)
+                _tick(f"  FAIL {table_name}: status={status}\n")
                 all_ok = False
                 continue
 
             if default_min == 0:
-                print(f"  OK   {table_name}: status=ACTIVE (bos tablo, beklenen)", flush=True)
+                _tick(f"  OK   {table_name}: status=ACTIVE (bos tablo, beklenen)\n")
                 continue
 
             expected = _load_expected_count(table_name)
+            approx_count = resp["Table"]["ItemCount"]
 
             if quick:
-                approx_count = resp["Table"]["ItemCount"]
                 if approx_count >= expected:
-                    print(f"  OK   {table_name}: ~{approx_count} kayit (beklenen: {expected})", flush=True)
+                    _tick(f"  OK   {table_name}: ~{approx_count} kayit (beklenen: {expected})\n")
                 elif approx_count > 0:
-                    print(f"  WARN {table_name}: ~{approx_count} kayit (beklenen: {expected}) - ItemCount yaklasiktir, --quick olmadan calistirin", flush=True)
+                    _tick(f"  WARN {table_name}: ~{approx_count} kayit (beklenen: {expected}) - ItemCount yaklasiktir, --quick olmadan calistirin\n")
                 else:
                     scan_resp = dynamodb.scan(TableName=table_name, Limit=1, Select="COUNT")
                     if scan_resp["Count"] > 0:
-                        print(f"  WARN {table_name}: veri var ama ItemCount=0 (henuz guncellenmedi), --quick olmadan calistirin", flush=True)
+                        _tick(f"  WARN {table_name}: veri var ama ItemCount=0 (henuz guncellenmedi), --quick olmadan calistirin\n")
                     else:
-                        print(f"  FAIL {table_name}: tablo bos, beklenen: {expected}", flush=True)
+                        _tick(f"  FAIL {table_name}: tablo bos, beklenen: {expected}\n")
                         all_ok = False
+            elif not full and expected > 0 and abs(approx_count - expected) / expected < ITEM_COUNT_TOLERANCE:
+                # describe_table O(1) ve RCU harcamaz; yeterince yakinsa scan gereksiz
+                _tick(f"  OK   {table_name}: ~{approx_count} kayit (beklenen: {expected}) - ItemCount, scan atlandi\n")
             else:
-                print(f"  ...  {table_name}: sayiliyor...", end="", flush=True)
-                actual = _count_table_items(dynamodb, table_name)
+                _tick(f"  ...  {table_name}: sayiliyor...", force=True)  # scan uzun surer, hemen goster
+                actual = _count_table_items(client_factory, table_name)
                 if actual == expected:
-                    print(f"\r  OK   {table_name}: {actual} kayit (beklenen: {expected}) - TAM ESLESME", flush=True)
+                    _tick(f"\r  OK   {table_name}: {actual} kayit (beklenen: {expected}) - TAM ESLESME\n")
                 elif actual >= expected:
-                    print(f"\r  OK   {table_name}: {actual} kayit (beklenen: {expected})", flush=True)
+                    _tick(f"\r  OK   {table_name}: {actual} kayit (beklenen: {expected})\n")
                 else:
                     missing = expected - actual
                     pct = (actual / expected * 100) if expected > 0 else 0
-                    print(f"\r  FAIL {table_name}: {actual}/{expected} kayit (%{pct:.1f}) - {missing} kayit EKSIK", flush=True)
+                    _tick(f"\r  FAIL {table_name}: {actual}/{expected} kayit (%{pct:.1f}) - {missing} kayit EKSIK\n")
                     all_ok = False
 
         except ClientError as e:
-            print(f"  FAIL {table_name}: {e.response['Error']['Message']}", flush=True)
+            _tick(f"  FAIL {table_name}: {e.response['Error']['Message']}\n")
             all_ok = False
+    sys.stdout.flush()
     return all_ok
 
 
-def verify_s3(region=REGION):
-    """S3 bucket ve dosyalarini kontrol eder."""
+def _head_s3_object(s3, bucket_name, s3_key):
+    """(key, var_mi, boyut) dondurur."""
+    try:
+        resp = s3.head_object(Bucket=bucket_name, Key=s3_key)
+        return s3_key, True, resp["ContentLength"]
+    except ClientError:
+        return s3_key, False, 0
+
+
+def verify_s3(region=REGION, out=None):
+    """S3 bucket ve dosyalarini kontrol eder.
+
+    out verilirse cikti oraya yazilir (main, DynamoDB ile paralel calisirken
+    ciktilar karismasin diye StringIO verir).
+    """
+    out = out or sys.stdout
     from data_layer.infrastructure.s3_setup import get_bucket_name
-    s3 = boto3.client("s3", region_name=region, verify=False)
+    s3 = _client("s3", region)
     bucket_name = get_bucket_name(region)
     all_ok = True
-    print(f"\n--- S3 Dogrulama ({bucket_name}) ---\n", flush=True)
+    print(f"\n--- S3 Dogrulama ({bucket_name}) ---\n", file=out, flush=True)
     try:
         s3.head_bucket(Bucket=bucket_name)
-        print(f"  OK  Bucket mevcut: {bucket_name}", flush=True)
+        print(f"  OK  Bucket mevcut: {bucket_name}", file=out, flush=True)
     except ClientError:
-        print(f"  FAIL Bucket bulunamadi: {bucket_name}", flush=True)
+        print(f"  FAIL Bucket bulunamadi: {bucket_name}", file=out, flush=True)
         return False
-    for s3_key in EXPECTED_S3_FILES:
-        try:
-            resp = s3.head_object(Bucket=bucket_name, Key=s3_key)
-            size_kb = resp["ContentLength"] / 1024
-            print(f"  OK  {s3_key} ({size_kb:.1f} KB)", flush=True)
-        except ClientError:
-            print(f"  FAIL {s3_key} bulunamadi", flush=True)
-            all_ok = False
+    # head_object cagrilari paralel; map sirayi korur
+    with ThreadPoolExecutor(max_workers=len(EXPECTED_S3_FILES)) as executor:
+        results = executor.map(lambda key: _head_s3_object(s3, bucket_name, key), EXPECTED_S3_FILES)
+        for s3_key, found, size in results:
+            if found:
+                print(f"  OK  {s3_key} ({size / 1024:.1f} KB)", file=out, flush=True)
+            else:
+                print(f"  FAIL {s3_key} bulunamadi", file=out, flush=True)
+                all_ok = False
     return all_ok
 
 
 def main():
     region = os.environ.get("AWS_DEFAULT_REGION", REGION)
     quick = "--quick" in sys.argv
+    full = "--full" in sys.argv
 
     print("=" * 50, flush=True)
     print("AWS Altyapi Dogrulama", flush=True)
     print(f"Region: {region}", flush=True)
     if quick:
         print("Mod: HIZLI (yaklasik, describe_table)", flush=True)
-    else:
+    elif full:
         print("Mod: GERCEK SAYIM (full scan)", flush=True)
+    else:
+        print("Mod: HIBRIT (ItemCount, gerekirse full scan)", flush=True)
     print("=" * 50, flush=True)
 
-    db_ok = verify_dynamodb(region, quick=quick)
-    s3_ok = verify_s3(region)
+    # DynamoDB ve S3 birbirinden bagimsiz: S3 arka planda dogrulanir, ciktisi
+    # DynamoDB bittikten sonra sirayla yazilir (DynamoDB ilerlemesi canli kalir)
+    s3_out = io.StringIO()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        s3_future = executor.submit(verify_s3, region, s3_out)
+        db_ok = verify_dynamodb(region, quick=quick, full=full)
+        s3_ok = s3_future.result()
+    sys.stdout.write(s3_out.getvalue())
 
     print("\n" + "=" * 50, flush=True)
     if db_ok and s3_ok:
@@ -9,17 +9,54 @@ Kullanım:
     python demo.py
 """
 
+import asyncio
+import functools
 import json
 import os
 import sys
+from collections import defaultdict
 
 import env_loader
-import boto3
 
 # Region'ı creds'ten al
 REGION = os.environ.get("AWS_DEFAULT_REGION", "us-west-2")
 
 
+# Ortak Config (pool, keep-alive); Bedrock throttling'i ardışık Nova
+# çağrılarında sık görüldüğü için retry sayısı artırılır.
+_BEDROCK_RETRIES = {"max_attempts": 10, "mode": "adaptive"}
+
+
+@functools.lru_cache(maxsize=None)
+def _client(service):
+    """Servis başına tek boto3 client'ı döndürür.
+
+    Tüm testler ve agentlar aynı bedrock-runtime client'ını (tek connection
+    pool) paylaşır; pool eşzamanlı Nova çağrı sayısından büyük tutulur.
+    boto3 (ve src.agents) ağır import'lardır; credential eksikse script
+    bunları hiç yüklemeden çıkar.
+    """
+    return env_loader.get_session().client(service, region_name=REGION, config=env_loader.get_boto_config(retries=_BEDROCK_RETRIES))
+
+
+class _Noop:
+    """Demo'da DynamoDB/S3 yerine geçen hafif stub.
+
+    Her attribute erişimi ve çağrı kendini döndürür; böylece
+    .Table("X").put_item(...) zincirleri MagicMock'un her erişimde alt mock
+    üretme maliyeti olmadan çalışır.
+    """
+
+    def __getattr__(self, _name):
+        return self
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def __bool__(self):
+        return True
+
+
 def check_credentials():
     """AWS credential'larının ayarlı olduğunu kontrol eder."""
     required = ["AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_SESSION_TOKEN"]
@@ -40,7 +77,7 @@ def test_bedrock_connection():
     """Bedrock'a bağlantıyı test eder."""
     print("\n--- Bedrock Bağlantı Testi ---")
     try:
-        client = boto3.client("bedrock", region_name=REGION)
+        client = _client("bedrock")
         profiles = client.list_inference_profiles()
         nova_profiles = [
             p["inferenceProfileId"]
@@ -55,49 +92,83 @@ def test_bedrock_connection():
         return False
 
 
-def test_nova_model_invoke():
-    """Nova modelini doğrudan çağırarak test eder."""
+# Tüm modellere aynı istek gönderilir; gövde bir kez serialize edilir
+_NOVA_TEST_BODY = json.dumps({
+    "messages": [
+        {
+            "role": "user",
+            "content": [{"text": "Merhaba, sen bir depo stok yönetim asistanısın. Kısaca kendini tanıt."}],
+        }
+    ],
+    "inferenceConfig": {"max_new_tokens": 200, "temperature": 0.7},
+}).encode("utf-8")
+
+
+def _invoke_nova(client, model_id):
+    """Tek bir Nova modelini çağırır, yanıt metnini döner."""
+    response = client.invoke_model(
+        modelId=model_id,
+        contentType="application/json",
+        accept="application/json",
+        body=_NOVA_TEST_BODY,
+    )
+    result = json.loads(response["body"].read())
+    return result.get("output", {}).get("message", {}).get("content", [{}])[0].get("text", "")
+
+
+async def test_nova_model_invoke():
+    """Nova modellerini doğrudan ve eşzamanlı çağırarak test eder."""
     print("\n--- Nova Model Çağrı Testi ---")
-    client = boto3.client("bedrock-runtime", region_name=REGION)
-
-    # Nova Lite dene
-    for model_id in ["us.amazon.nova-lite-v1:0", "us.amazon.nova-pro-v1:0"]:
-        try:
-            response = client.invoke_model(
-                modelId=model_id,
-                contentType="application/json",
-                accept="application/json",
-                body=json.dumps({
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": [{"text": "Merhaba, sen bir depo stok yönetim asistanısın. Kısaca kendini tanıt."}],
-                        }
-                    ],
-                    "inferenceConfig": {"max_new_tokens": 200, "temperature": 0.7},
-                }),
-            )
-            result = json.loads(response["body"].read())
-            text = result.get("output", {}).get("message", {}).get("content", [{}])[0].get("text", "")
+    client = _client("bedrock-runtime")
+
+    # Nova Lite ve Pro aynı anda; toplam süre en yavaş çağrı kadar
+    model_ids = ["us.amazon.nova-lite-v1:0", "us.amazon.nova-pro-v1:0"]
+    results = await asyncio.gather(
+        *(asyncio.to_thread(_invoke_nova, client, model_id) for model_id in model_ids),
+        return_exceptions=True,
+    )
+    for model_id, result in zip(model_ids, results):
+        if isinstance(result, Exception):
+            print(f"❌ {model_id} hatası: {result}")
+        else:
             print(f"✅ {model_id} çalışıyor")
-            print(f"   Yanıt: {text[:150]}...")
-        except Exception as e:
-            print(f"❌ {model_id} hatası: {e}")
+            print(f"   Yanıt: {result[:150]}...")
+
+
+async def run_model_calls(calls):
+    """Agent'ların Nova çağrılarını eşzamanlı çalıştırır, sonuçları sırayla yazdırır.
+
+    calls: (etiket, parametresiz fonksiyon) listesi.
+    """
+    print("\n--- Nova Model Çağrıları (eşzamanlı) ---")
+    results = await asyncio.gather(
+        *(asyncio.to_thread(fn) for _, fn in calls),
+        return_exceptions=True,
+    )
+    for (label, _), result in zip(calls, results):
+        if isinstance(result, Exception):
+            print(f"❌ {label} hatası: {result}")
+        else:
+            print(f"✅ {label} tamamlandı")
+            print(f"   Sonuç: {json.dumps(result, ensure_ascii=False, indent=2)[:300]}")
 
 
 def test_inventory_monitor_agent():
-    """Inventory Monitor Agent'ı gerçek Bedrock ile test eder."""
+    """Inventory Monitor Agent'ı gerçek Bedrock ile test eder.
+
+    Nova trend analizi çağrısını (etiket, fonksiyon) olarak döner; main diğer
+    model çağrılarıyla birlikte eşzamanlı çalıştırır.
+    """
     print("\n--- Inventory Monitor Agent Testi ---")
     from src.agents.inventory_monitor import InventoryMonitorAgent
-    from unittest.mock import MagicMock
 
     # Gerçek Bedrock client, mock DynamoDB/S3
-    bedrock_client = boto3.client("bedrock-runtime", region_name=REGION)
+    bedrock_client = _client("bedrock-runtime")
     agent = InventoryMonitorAgent(
         region_name=REGION,
         bedrock_runtime_client=bedrock_client,
-        dynamodb_resource=MagicMock(),
-        s3_client=MagicMock(),
+        dynamodb_resource=_Noop(),
+        s3_client=_Noop(),
     )
 
     # Stok verisi ekle
@@ -113,27 +184,23 @@ def test_inventory_monitor_agent():
         print(f"   ⚠️  {a.warehouse_id}/{a.sku}: stok={a.current_quantity}, eşik={a.threshold}, şiddet={a.severity.value}")
 
     # Nova ile trend analizi
-    print("\n   Nova model ile stok trend analizi yapılıyor...")
-    try:
-        trend = agent.analyze_stock_trends("WH001", "SKU001")
-        print(f"✅ Trend analizi tamamlandı")
-        print(f"   Sonuç: {json.dumps(trend, ensure_ascii=False, indent=2)[:300]}")
-    except Exception as e:
-        print(f"❌ Trend analizi hatası: {e}")
+    return "Trend analizi", lambda: agent.analyze_stock_trends("WH001", "SKU001")
 
 
 def test_sales_predictor_agent():
-    """Sales Predictor Agent'ı gerçek Bedrock ile test eder."""
+    """Sales Predictor Agent'ı gerçek Bedrock ile test eder.
+
+    Nova tahmin çağrısını (etiket, fonksiyon) olarak döner.
+    """
     print("\n--- Sales Predictor Agent Testi ---")
     from src.agents.sales_predictor import SalesPredictorAgent
-    from unittest.mock import MagicMock
 
-    bedrock_client = boto3.client("bedrock-runtime", region_name=REGION)
+    bedrock_client = _client("bedrock-runtime")
     agent = SalesPredictorAgent(
         region_name=REGION,
         bedrock_runtime_client=bedrock_client,
-        dynamodb_resource=MagicMock(),
-        s3_client=MagicMock(),
+        dynamodb_resource=_Noop(),
+        s3_client=_Noop(),
     )
 
     # Veri ayarla
@@ -155,28 +222,24 @@ def test_sales_predictor_agent():
     print(f"   🏆 En iyi depo: {best.warehouse_id} (skor: {best.sales_potential_score})")
 
     # Nova ile tahmin
-    print("\n   Nova model ile satış tahmini yapılıyor...")
-    try:
-        prediction = agent.predict_with_model("WH001", "SKU001")
-        print(f"✅ Model tahmini tamamlandı")
-        print(f"   Sonuç: {json.dumps(prediction, ensure_ascii=False, indent=2)[:300]}")
-    except Exception as e:
-        print(f"❌ Model tahmin hatası: {e}")
+    return "Model tahmini", lambda: agent.predict_with_model("WH001", "SKU001")
 
 
 def test_transfer_coordinator_agent():
-    """Transfer Coordinator Agent'ı test eder."""
+    """Transfer Coordinator Agent'ı test eder.
+
+    Nova karar çağrısını (etiket, fonksiyon) olarak döner.
+    """
     print("\n--- Transfer Coordinator Agent Testi ---")
     from src.agents.transfer_coordinator import TransferCoordinatorAgent
     from src.models.warehouse import ApprovalConfig, OperationMode
-    from unittest.mock import MagicMock
 
-    bedrock_client = boto3.client("bedrock-runtime", region_name=REGION)
+    bedrock_client = _client("bedrock-runtime")
     agent = TransferCoordinatorAgent(
         region_name=REGION,
         bedrock_runtime_client=bedrock_client,
-        dynamodb_resource=MagicMock(),
-        s3_client=MagicMock(),
+        dynamodb_resource=_Noop(),
+        s3_client=_Noop(),
     )
 
     # Stok ayarla
@@ -210,15 +273,10 @@ def test_transfer_coordinator_agent():
     print(f"   WH005 stok: {agent.get_stock('WH005', 'SKU002')}, WH004 stok: {agent.get_stock('WH004', 'SKU002')}")
 
     # Nova ile karar
-    print("\n   Nova model ile transfer kararı alınıyor...")
-    try:
-        decision = agent.decide_with_model(
-            "WH001", "SKU001", 5, 50,
-            [{"warehouse_id": "WH002", "quantity": 200}, {"warehouse_id": "WH003", "quantity": 150}]
-        )
-        print(f"✅ Model kararı: {json.dumps(decision, ensure_ascii=False, indent=2)[:300]}")
-    except Exception as e:
-        print(f"❌ Model karar hatası: {e}")
+    return "Model kararı", lambda: agent.decide_with_model(
+        "WH001", "SKU001", 5, 50,
+        [{"warehouse_id": "WH002", "quantity": 200}, {"warehouse_id": "WH003", "quantity": 150}]
+    )
 
 
 def test_full_workflow():
@@ -231,14 +289,11 @@ def test_full_workflow():
     from src.agents.sales_predictor import SalesPredictorAgent
     from src.agents.stock_aging_analyzer import StockAgingAnalyzerAgent
     from src.agents.transfer_coordinator import TransferCoordinatorAgent
-    from src.agents.communication import MessageBus, AgentMessage, MessageType
     from src.agents.stock_validator import StockValidator
-    from unittest.mock import MagicMock
-    import uuid
 
-    mock_dynamo = MagicMock()
-    mock_s3 = MagicMock()
-    bedrock_client = boto3.client("bedrock-runtime", region_name=REGION)
+    mock_dynamo = _Noop()
+    mock_s3 = _Noop()
+    bedrock_client = _client("bedrock-runtime")
 
     # 1. Agentları oluştur
     monitor = InventoryMonitorAgent(region_name=REGION, bedrock_runtime_client=bedrock_client, dynamodb_resource=mock_dynamo, s3_client=mock_s3)
@@ -262,9 +317,11 @@ def test_full_workflow():
         ("WH003", "SKU002"): 30,   # Düşük
     }
 
+    sku_totals = defaultdict(int)
     for (wh, sku), qty in stock_data.items():
         monitor.update_stock(wh, sku, qty)
         coordinator.set_stock(wh, sku, qty)
+        sku_totals[sku] += qty
 
     for wh_id, info in warehouses.items():
         predictor.set_warehouse_region(wh_id, info["region"])
@@ -284,14 +341,13 @@ def test_full_workflow():
     # Snapshot al
     validator.take_snapshot(stock_data)
     for sku in ["SKU001", "SKU002"]:
-        total = sum(qty for (_, s), qty in stock_data.items() if s == sku)
-        validator.register_total_stock(sku, total)
+        validator.register_total_stock(sku, sku_totals[sku])
 
     print("\n📊 Başlangıç Durumu:")
     for (wh, sku), qty in sorted(stock_data.items()):
         print(f"   {wh}/{sku}: {qty}")
-    print(f"   Toplam SKU001: {coordinator.get_total_stock('SKU001')}")
-    print(f"   Toplam SKU002: {coordinator.get_total_stock('SKU002')}")
+    print(f"   Toplam SKU001: {sku_totals['SKU001']}")
+    print(f"   Toplam SKU002: {sku_totals['SKU002']}")
 
     # 3. Inventory Monitor: Kritik stok tespiti
     print("\n🔍 Adım 1: Stok İzleme")
@@ -317,6 +373,7 @@ def test_full_workflow():
 
     # 6. Transfer Coordinator: Transfer yap
     print("\n🚚 Adım 4: Transfer İşlemleri")
+    prior = dict(stock_data)  # audit log için transfer öncesi stok
     for alert in alerts:
         source = coordinator.select_source_warehouse(alert.sku, alert.warehouse_id, alert.threshold - alert.current_quantity)
         if source:
@@ -327,8 +384,8 @@ def test_full_workflow():
                 print(f"   ✅ {source} -> {alert.warehouse_id}: {alert.sku} x{qty} ({transfer.status.value})")
 
                 # Audit log
-                validator.log_stock_change("transfer_out", source, alert.sku, stock_data.get((source, alert.sku), 0), coordinator.get_stock(source, alert.sku), "TransferCoordinator", transfer.transfer_id)
-                validator.log_stock_change("transfer_in", alert.warehouse_id, alert.sku, stock_data.get((alert.warehouse_id, alert.sku), 0), coordinator.get_stock(alert.warehouse_id, alert.sku), "TransferCoordinator", transfer.transfer_id)
+                validator.log_stock_change("transfer_out", source, alert.sku, prior.get((source, alert.sku), 0), coordinator.get_stock(source, alert.sku), "TransferCoordinator", transfer.transfer_id)
+                validator.log_stock_change("transfer_in", alert.warehouse_id, alert.sku, prior.get((alert.warehouse_id, alert.sku), 0), coordinator.get_stock(alert.warehouse_id, alert.sku), "TransferCoordinator", transfer.transfer_id)
 
     # 7. Validasyon
     print("\n✅ Adım 5: Stok Tutarlılığı Doğrulama")
@@ -355,10 +412,13 @@ if __name__ == "__main__":
     check_credentials()
     
     if test_bedrock_connection():
-        test_nova_model_invoke()
-        test_inventory_monitor_agent()
-        test_sales_predictor_agent()
-        test_transfer_coordinator_agent()
+        asyncio.run(test_nova_model_invoke())
+        model_calls = [
+            test_inventory_monitor_agent(),
+            test_sales_predictor_agent(),
+            test_transfer_coordinator_agent(),
+        ]
+        asyncio.run(run_model_calls(model_calls))
         test_full_workflow()
     
     print("\n" + "=" * 60)
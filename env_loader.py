@@ -1,12 +1,70 @@
 """Merkezi .env yukleyici. Tum scriptler bunu import etsin."""
+import functools
 import os
 from pathlib import Path
+
+import urllib3
 from dotenv import load_dotenv
 
-# Proje kokundeki .env dosyasini bul ve yukle
-_env_path = Path(__file__).resolve().parent / ".env"
-load_dotenv(_env_path, override=False)
+# Proje kokundeki .env dosyasini bul ve yukle. Sentinel, ayni ortami devralan
+# alt prosesler (subprocess, yeniden import) .env'i tekrar parse etmesin diye.
+if "_ENV_LOADED" not in os.environ:
+    _env_path = Path(__file__).resolve().parent / ".env"
+    load_dotenv(_env_path, override=False)
+    os.environ["_ENV_LOADED"] = "1"
+
+
+def _env_flag(name):
+    """1/true/yes/on -> True; bos, 0/false/no/off ve digerleri -> False."""
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+# SSL workaround (kurumsal proxy/self-signed cert). Sadece .env/ortamda
+# DISABLE_TLS_VERIFY=1 (true/yes/on) ise; DISABLE_TLS_VERIFY=0/false veya
+# tanimsizsa sertifika dogrulamasi acik kalir.
+DISABLE_TLS_VERIFY = _env_flag("DISABLE_TLS_VERIFY")
+if DISABLE_TLS_VERIFY:
+    os.environ["AWS_CA_BUNDLE"] = ""
+    os.environ["CURL_CA_BUNDLE"] = ""
+    # Dogrulama bilerek kapatildi; InsecureRequestWarning'i her dosyada ayri
+    # ayri degil burada bir kez kapat. Flag yoksa uyari gorunur kalir.
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# boto3 client/resource cagrilarina verify=env_loader.VERIFY gecilir: flag
+# aciksa False (dogrulama kapali), degilse None (botocore varsayilani, acik).
+VERIFY = False if DISABLE_TLS_VERIFY else None
+
+
+@functools.lru_cache(maxsize=1)
+def get_session():
+    """Proses genelinde paylasilan boto3 Session'i dondurur.
+
+    Ayni Session'dan uretilen client'lar endpoint/credential/loader cache'lerini
+    paylasir; her boto3.client() cagrisinda bunlar yeniden kurulmaz. boto3 ilk
+    cagrida import edilir, env_loader'i import etmek boto3'u yuklemez.
+    """
+    import boto3
+    return boto3.session.Session()
+
+
+@functools.lru_cache(maxsize=1)
+def _base_boto_config():
+    from botocore.config import Config
+    return Config(
+        max_pool_connections=50,
+        tcp_keepalive=True,
+        retries={"max_attempts": 5, "mode": "adaptive"},
+    )
+
+
+def get_boto_config(**overrides):
+    """Scriptlerin ortak kullandigi botocore Config (pool 50, keep-alive, adaptive retry).
 
-# SSL workaround (kurumsal proxy/self-signed cert)
-os.environ["AWS_CA_BUNDLE"] = ""
-os.environ["CURL_CA_BUNDLE"] = ""
+    overrides verilirse (or. max_pool_connections=64, read_timeout=5) ortak
+    ayarlarin uzerine yazilmis bir kopya doner; ortak Config degismez.
+    """
+    base = _base_boto_config()
+    if not overrides:
+        return base
+    from botocore.config import Config
+    return base.merge(Config(**overrides))
@@ -0,0 +1,48 @@
+"""Deploy edilen agent'in runtime ARN'ini okur (invoke_agent.py ve cleanup.py ortak kullanir)."""
+import functools
+import os
+import re
+
+CONFIG_PATH = ".bedrock_agentcore.yaml"
+# Tek bir anahtar icin PyYAML yuklemeye gerek yok. Iki noktadan sonra sadece bosluk/tab:
+# \s satir sonunu da yutar ve bos degerde bir sonraki satirin token'ini dondururdu
+_ARN_RE = re.compile(r"^[ \t]*agent_runtime_arn:[ \t]*[\"']?([^\"'\s]+)", re.M)
+# YAML'da bos deger anlamina gelen skalerler
+_YAML_NULLS = frozenset({"null", "Null", "NULL", "~"})
+
+
+def _clean(value):
+    if not isinstance(value, str) or not value or value in _YAML_NULLS:
+        return None
+    return value
+
+
+@functools.lru_cache(maxsize=1)
+def _read_config_arn(path: str, mtime_ns: int):
+    """Config'teki agent_runtime_arn'i okur; mtime degismedikce cache'ten doner."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    m = _ARN_RE.search(text)
+    if m:
+        return _clean(m.group(1))
+
+    # Beklenmeyen format (or. flow style) icin tam YAML parse
+    try:
+        import yaml
+    except ImportError:
+        return None
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    config = yaml.load(text, Loader=loader) or {}
+    return _clean((config.get("bedrock_agentcore") or {}).get("agent_runtime_arn"))
+
+
+def agent_runtime_arn(path: str = CONFIG_PATH):
+    """ARN'i AGENT_ARN env var'dan, yoksa config dosyasindan dondurur; bulunamazsa None."""
+    arn = os.environ.get("AGENT_ARN")
+    if arn:
+        return arn
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    return _read_config_arn(path, mtime_ns)
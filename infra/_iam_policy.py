@@ -0,0 +1,15 @@
+"""IAM inline policy yardimcilari (deploy.py ve step1_iam.py ortak kullanir)."""
+import hashlib
+import json
+from urllib.parse import unquote
+
+
+def policy_hash(doc) -> bytes:
+    """Policy dokumanini anahtar sirasindan bagimsiz hash'ler (str, URL-encoded str veya dict).
+
+    get_role_policy PolicyDocument'i URL-encoded string ya da dict olarak
+    dondurebilir; yerel dosyadaki JSON ile ayni icerik ayni hash'i verir.
+    """
+    if isinstance(doc, str):
+        doc = json.loads(unquote(doc))
+    return hashlib.sha256(json.dumps(doc, sort_keys=True).encode()).digest()
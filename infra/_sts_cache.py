@@ -0,0 +1,64 @@
+"""STS GetCallerIdentity sonucunu kisa sureli dosya cache'inde tutar.
+
+Cache sadece account ID lookup'lari icindir (or. role ARN'i kurmak). Credential
+dogrulamasi yapan adimlar (deploy check_credentials, set_creds) her zaman
+get_caller_identity() ile STS'e gider; suresi dolmus/rotate edilmis credential
+cache'ten "gecerli" gorunmesin. Cache anahtari profil adi degil, session'in
+cozdugu access key'in hash'idir; farkli hesaba gecen profil eski kaydi okumaz.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+CACHE_DIR = Path.home() / ".cache" / "amazon-hack"
+TTL_SECONDS = 15 * 60
+
+
+def _session():
+    import env_loader
+    return env_loader.get_session()
+
+
+def _cache_path(session) -> Path:
+    creds = session.get_credentials()
+    key = creds.access_key if creds is not None else "anonymous"
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    return CACHE_DIR / f"sts-{digest}.json"
+
+
+def _write_cache(path: Path, identity: dict) -> None:
+    # Ayni anda calisan scriptler yarim dosya okumasin diye tmp + replace
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(identity, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def get_caller_identity(region: str) -> dict:
+    """STS'e giderek credential'i dogrular; sonucu account lookup'lari icin cache'e yazar."""
+    import env_loader
+    session = _session()
+    sts = session.client("sts", region_name=region, verify=env_loader.VERIFY, config=env_loader.get_boto_config())
+    identity = sts.get_caller_identity()
+    identity = {k: identity[k] for k in ("Account", "Arn", "UserId")}
+    _write_cache(_cache_path(session), identity)
+    return identity
+
+
+def get_account_id_cached(region: str) -> str:
+    """Account ID'yi cache'ten (yoksa STS'ten) dondurur. Credential dogrulamasi yerine kullanilmaz."""
+    path = _cache_path(_session())
+    try:
+        if time.time() - path.stat().st_mtime < TTL_SECONDS:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)["Account"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return get_caller_identity(region)["Account"]
@@ -3,8 +3,9 @@ import sys, os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 import env_loader
 import boto3
+
 try:
-    sts = boto3.client("sts", region_name="us-west-2", verify=False)
+    sts = boto3.client("sts", region_name="us-west-2", verify=env_loader.VERIFY, config=env_loader.get_boto_config())
     i = sts.get_caller_identity()
     print(f"Account: {i['Account']}")
     print(f"ARN: {i['Arn']}")
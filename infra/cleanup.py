@@ -2,46 +2,110 @@
 AgentCore ve IAM kaynaklarini temizler.
 
 Kullanim:
-    agentcore destroy
     python infra/cleanup.py
 """
 
+import os
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
-from botocore.exceptions import ClientError
+from botocore.exceptions import BotoCoreError, ClientError
 
+from _agent_config import agent_runtime_arn
+
+REGION = os.environ.get("AWS_DEFAULT_REGION", "us-west-2")
 ROLE_NAME = "BedrockAgentCore-WarehouseStockMgmt-ExecutionRole"
-POLICY_NAME = "BedrockAgentCore-WarehouseStockMgmt-Policy"
 
 
-def main():
-    print("AgentCore temizlik baslatiliyor...")
+def destroy_agent_runtime(session):
+    """Agent kaynaklarini 'agentcore destroy' ile siler.
 
-    # 1. agentcore destroy
-    print("\n[1/2] agentcore destroy...")
+    CLI runtime'in yaninda endpoint, ECR repo, CodeBuild projesi ve memory'yi de
+    kaldirir. CLI yoksa veya basarisiz olursa sadece runtime SDK ile silinir; bu
+    durumda diger kaynaklar geride kalir ve elle silinmelidir.
+    """
     try:
-        subprocess.run(["agentcore", "destroy"], timeout=120)
+        result = subprocess.run(["agentcore", "destroy"], timeout=120)
+        if result.returncode == 0:
+            return
+        print(f"  Uyari: agentcore destroy basarisiz (code={result.returncode})")
     except (FileNotFoundError, subprocess.TimeoutExpired) as e:
         print(f"  Uyari: {e}")
 
-    # 2. IAM temizlik
-    print("\n[2/2] IAM temizlik...")
-    iam = boto3.client("iam")
+    arn = agent_runtime_arn()
+    if not arn:
+        print("  Runtime ARN bulunamadi (AGENT_ARN / .bedrock_agentcore.yaml), runtime silinemedi")
+        return
+    # arn:aws:bedrock-agentcore:<region>:<account>:runtime/<id>
+    parts = arn.split(":")
+    region = parts[3] if len(parts) > 3 and parts[3] else REGION
+    runtime_id = arn.rsplit("/", 1)[-1]
+    try:
+        client = session.client("bedrock-agentcore-control", region_name=region)
+        client.delete_agent_runtime(agentRuntimeId=runtime_id)
+        print(f"  Runtime SDK ile silindi: {runtime_id}")
+        print("  Not: endpoint, ECR repo, CodeBuild projesi ve memory silinmedi; "
+              "'agentcore destroy' ile veya konsoldan temizleyin")
+    except (ClientError, BotoCoreError) as e:
+        print(f"  Uyari: runtime SDK ile silinemedi: {e}")
+
 
+def delete_role(iam, role_name):
+    """Role'deki tum inline/attached policy'leri paralel kaldirip role'u siler."""
+    # Liste cagrilari sayfali (varsayilan 100); paginator tum sayfalari dolasir
     try:
-        iam.delete_role_policy(RoleName=ROLE_NAME, PolicyName=POLICY_NAME)
-        print(f"  Policy silindi: {POLICY_NAME}")
+        inline = [name
+                  for page in iam.get_paginator("list_role_policies").paginate(RoleName=role_name)
+                  for name in page["PolicyNames"]]
+        attached = [p
+                    for page in iam.get_paginator("list_attached_role_policies").paginate(RoleName=role_name)
+                    for p in page["AttachedPolicies"]]
     except ClientError as e:
-        print(f"  Policy silinemedi: {e}")
+        print(f"  Role okunamadi: {e}")
+        return
+
+    def remove(kind, name, call):
+        try:
+            call()
+            return f"  {kind} kaldirildi: {name}"
+        except ClientError as e:
+            return f"  {kind} kaldirilamadi ({name}): {e}"
+
+    jobs = [
+        ("Policy", name, lambda name=name: iam.delete_role_policy(RoleName=role_name, PolicyName=name))
+        for name in inline
+    ] + [
+        ("Managed policy", p["PolicyName"],
+         lambda arn=p["PolicyArn"]: iam.detach_role_policy(RoleName=role_name, PolicyArn=arn))
+        for p in attached
+    ]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for message in executor.map(lambda job: remove(*job), jobs):
+            print(message)
 
     try:
-        iam.delete_role(RoleName=ROLE_NAME)
-        print(f"  Role silindi: {ROLE_NAME}")
+        iam.delete_role(RoleName=role_name)
+        print(f"  Role silindi: {role_name}")
     except ClientError as e:
         print(f"  Role silinemedi: {e}")
 
+
+def main():
+    print("AgentCore temizlik baslatiliyor...")
+
+    session = boto3.session.Session()
+
+    # 1. Agent runtime
+    print("\n[1/2] Agent runtime siliniyor...")
+    destroy_agent_runtime(session)
+
+    # 2. IAM temizlik
+    print("\n[2/2] IAM temizlik...")
+    iam = session.client("iam", region_name=REGION)
+    delete_role(iam, ROLE_NAME)
+
     print("\nTemizlik tamamlandi.")
 
 
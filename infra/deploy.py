@@ -11,17 +11,18 @@ import json
 import os
 import sys
 import time
+import shutil
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 import env_loader
 
-import urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-import boto3
 from botocore.exceptions import ClientError
 
+from _iam_policy import policy_hash
+from _sts_cache import get_caller_identity
+
 REGION = os.environ.get("AWS_DEFAULT_REGION", "us-west-2")
 ROLE_NAME = "BedrockAgentCore-WarehouseStockMgmt-ExecutionRole"
 POLICY_NAME = "BedrockAgentCore-WarehouseStockMgmt-Policy"
@@ -40,14 +41,30 @@ TRUST_POLICY = {
 }
 
 EXECUTION_POLICY_PATH = os.path.join(os.path.dirname(__file__), "agentcore_execution_policy.json")
+with open(EXECUTION_POLICY_PATH) as _f:
+    EXECUTION_POLICY = _f.read()
+
+# agentcore alt prosesleri icin ortam; her denemede os.environ kopyalanmasin
+SUBPROC_ENV = {**os.environ, "AWS_CA_BUNDLE": "", "CURL_CA_BUNDLE": ""}
+
+# agentcore CLI PATH'te yoksa toolkit modulu uzerinden calistir
+AGENTCORE_CMD = shutil.which("agentcore")
+AGENTCORE_PREFIX = [AGENTCORE_CMD] if AGENTCORE_CMD else [sys.executable, "-m", "bedrock_agentcore_starter_toolkit"]
+
+# Tum IAM cagrilari ayni client'i (ve connection pool'u) kullanir
+_IAM = env_loader.get_session().client(
+    "iam",
+    region_name=REGION,
+    verify=env_loader.VERIFY,
+    config=env_loader.get_boto_config(),
+)
 
 
 def check_credentials():
     """AWS credential kontrolu."""
     print("\n[1/5] AWS kimlik kontrolu...")
     try:
-        sts = boto3.client("sts", region_name=REGION, verify=False)
-        identity = sts.get_caller_identity()
+        identity = get_caller_identity(REGION)
         account_id = identity["Account"]
         print(f"  Account: {account_id}")
         print(f"  ARN: {identity['Arn']}")
@@ -68,19 +85,11 @@ def check_credentials():
 def create_iam_role(account_id: str) -> str:
     """IAM execution role olusturur veya mevcut olani kullanir."""
     print("\n[2/5] IAM Execution Role olusturuluyor...")
-    iam = boto3.client("iam", region_name=REGION, verify=False)
-
-    # Role var mi kontrol et
-    try:
-        resp = iam.get_role(RoleName=ROLE_NAME)
-        role_arn = resp["Role"]["Arn"]
-        print(f"  Role zaten mevcut: {ROLE_NAME}")
-        print(f"  ARN: {role_arn}")
-        return role_arn
-    except iam.exceptions.NoSuchEntityException:
-        pass
+    iam = _IAM
 
-    # Yeni role olustur
+    # Once olusturmayi dene; role zaten varsa ARN account_id'den bilinir,
+    # ek bir get_role cagrisina gerek yok
+    role_arn = f"arn:aws:iam::{account_id}:role/{ROLE_NAME}"
     try:
         resp = iam.create_role(
             RoleName=ROLE_NAME,
@@ -91,50 +100,82 @@ def create_iam_role(account_id: str) -> str:
         print(f"  Role olusturuldu: {ROLE_NAME}")
         print(f"  ARN: {role_arn}")
         return role_arn
+    except iam.exceptions.EntityAlreadyExistsException:
+        print(f"  Role zaten mevcut: {ROLE_NAME}")
+        print(f"  ARN: {role_arn}")
+        return role_arn
     except ClientError as e:
         print(f"  HATA: Role olusturulamadi: {e}")
         sys.exit(1)
 
 
-def attach_policy():
-    """Execution policy'yi role'e ekler."""
+def attach_policy() -> bool:
+    """Execution policy'yi role'e ekler. Policy zaten ayniysa False doner."""
     print("\n[3/5] IAM Policy ekleniyor...")
-    iam = boto3.client("iam", region_name=REGION, verify=False)
+    iam = _IAM
 
-    with open(EXECUTION_POLICY_PATH) as f:
-        policy_doc = f.read()
+    try:
+        existing = iam.get_role_policy(RoleName=ROLE_NAME, PolicyName=POLICY_NAME)["PolicyDocument"]
+        if policy_hash(existing) == policy_hash(EXECUTION_POLICY):
+            print(f"  Policy degismemis, atlandi: {POLICY_NAME}")
+            return False
+    except ClientError:
+        pass
 
     try:
         iam.put_role_policy(
             RoleName=ROLE_NAME,
             PolicyName=POLICY_NAME,
-            PolicyDocument=policy_doc,
+            PolicyDocument=EXECUTION_POLICY,
         )
         print(f"  Policy eklendi: {POLICY_NAME}")
     except ClientError as e:
         print(f"  HATA: Policy eklenemedi: {e}")
         sys.exit(1)
+    return True
+
 
-    # IAM propagation bekle
-    print("  IAM propagation icin 10 saniye bekleniyor...")
-    time.sleep(10)
+# get_role_policy'nin policy'yi dondurmesi sadece IAM'in kendi okumasini
+# gosterir; role'u assume eden servise (AgentCore/STS) yayilmasi ayrica surer.
+# Bu yuzden policy gorunse bile put_role_policy'den sonra en az bu kadar beklenir.
+IAM_PROPAGATION_MIN_SECONDS = 10
+
+
+def wait_for_policy_ready(iam, role, policy, timeout=15):
+    """Inline policy IAM'den okunabilir olana kadar artan araliklarla (0.2s, 0.4s, ... max 2s) bekler.
+
+    Yayilmanin tamamlandigini kanitlamaz; wait_for_propagation minimum sureyi ayrica uygular.
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.2
+    while True:
+        try:
+            iam.get_role_policy(RoleName=role, PolicyName=policy)
+            return True
+        except ClientError:
+            if time.monotonic() + delay > deadline:
+                return False
+        time.sleep(delay)
+        delay = min(delay * 2, 2.0)
+
+
+def wait_for_propagation():
+    """IAM propagation bekler. configure adimi ile paralel calistirilir."""
+    start = time.monotonic()
+    if wait_for_policy_ready(_IAM, ROLE_NAME, POLICY_NAME):
+        print("  IAM policy IAM'de gorunur.")
+    else:
+        print("  Uyari: IAM policy 15 saniyede gorunmedi, devam ediliyor.")
+    remaining = IAM_PROPAGATION_MIN_SECONDS - (time.monotonic() - start)
+    if remaining > 0:
+        print(f"  IAM propagation icin {remaining:.0f} saniye daha bekleniyor (configure ile paralel)...")
+        time.sleep(remaining)
 
 
 def configure_agentcore(role_arn: str):
     """agentcore configure calistirir."""
     print("\n[4/5] AgentCore configure...")
-    cmd = [
-        sys.executable, "-m", "bedrock_agentcore_starter_toolkit",
-        "configure",
-        "-e", "agentcore_app.py",
-        "-r", REGION,
-        "--execution-role", role_arn,
-        "--non-interactive",
-    ]
-
-    # Oncelikle agentcore CLI'yi dene
-    agentcore_cmd = [
-        "agentcore",
+    cmd = AGENTCORE_PREFIX + [
         "configure",
         "-e", "agentcore_app.py",
         "-r", REGION,
@@ -142,29 +183,27 @@ def configure_agentcore(role_arn: str):
         "--non-interactive",
     ]
 
-    for attempt_cmd in [agentcore_cmd, cmd]:
-        try:
-            result = subprocess.run(
-                attempt_cmd,
-                capture_output=True,
-                text=True,
-                timeout=120,
-                env={**os.environ, "AWS_CA_BUNDLE": "", "CURL_CA_BUNDLE": ""},
-            )
-            if result.returncode == 0:
-                print("  Configure tamamlandi.")
-                if result.stdout:
-                    print(f"  {result.stdout.strip()[:200]}")
-                return
-            else:
-                print(f"  Komut basarisiz (code={result.returncode})")
-                if result.stderr:
-                    print(f"  stderr: {result.stderr.strip()[:300]}")
-        except FileNotFoundError:
-            continue
-        except subprocess.TimeoutExpired:
-            print("  HATA: Configure timeout (120s)")
-            continue
+    try:
+        result = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding="utf-8",
+            timeout=120,
+            env=SUBPROC_ENV,
+        )
+        if result.returncode == 0:
+            print("  Configure tamamlandi.")
+            if result.stdout:
+                print(f"  {result.stdout.strip()[:200]}")
+            return
+        print(f"  Komut basarisiz (code={result.returncode})")
+        if result.stderr:
+            print(f"  stderr: {result.stderr.strip()[:300]}")
+    except FileNotFoundError:
+        pass
+    except subprocess.TimeoutExpired:
+        print("  HATA: Configure timeout (120s)")
 
     print("  HATA: agentcore configure calistirilamadi!")
     print("  Manuel olarak calistirin:")
@@ -177,29 +216,26 @@ def deploy_agentcore():
     print("\n[5/5] AgentCore deploy baslatiliyor...")
     print("  Bu islem birkac dakika surebilir (CodeBuild + deploy)...")
 
-    for attempt_cmd in [["agentcore", "deploy"], [sys.executable, "-m", "bedrock_agentcore_starter_toolkit", "deploy"]]:
-        try:
-            # Deploy'u interaktif olarak calistir (output gorunsun)
-            result = subprocess.run(
-                attempt_cmd,
-                timeout=600,
-                env={**os.environ, "AWS_CA_BUNDLE": "", "CURL_CA_BUNDLE": ""},
-            )
-            if result.returncode == 0:
-                print("\n  Deploy tamamlandi!")
-                return
-            else:
-                print(f"\n  Deploy basarisiz (code={result.returncode})")
-                print("  Loglari kontrol edin: agentcore status")
-                sys.exit(1)
-        except FileNotFoundError:
-            continue
-        except subprocess.TimeoutExpired:
-            print("  HATA: Deploy timeout (10 dakika)")
-            sys.exit(1)
-
-    print("  HATA: agentcore deploy calistirilamadi!")
-    print("  Manuel olarak calistirin: agentcore deploy")
+    try:
+        # Deploy'u interaktif olarak calistir (output gorunsun)
+        result = subprocess.run(
+            AGENTCORE_PREFIX + ["deploy"],
+            timeout=600,
+            env=SUBPROC_ENV,
+        )
+    except FileNotFoundError:
+        print("  HATA: agentcore deploy calistirilamadi!")
+        print("  Manuel olarak calistirin: agentcore deploy")
+        sys.exit(1)
+    except subprocess.TimeoutExpired:
+        print("  HATA: Deploy timeout (10 dakika)")
+        sys.exit(1)
+
+    if result.returncode == 0:
+        print("\n  Deploy tamamlandi!")
+        return
+    print(f"\n  Deploy basarisiz (code={result.returncode})")
+    print("  Loglari kontrol edin: agentcore status")
     sys.exit(1)
 
 
@@ -211,8 +247,16 @@ def main():
 
     account_id = check_credentials()
     role_arn = create_iam_role(account_id)
-    attach_policy()
-    configure_agentcore(role_arn)
+    policy_changed = attach_policy()
+    # configure role'u henuz assume etmiyor; propagation beklemesi sadece
+    # deploy'dan once bitmis olmali. Policy degismediyse beklenecek bir sey yok.
+    if policy_changed:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            propagation = executor.submit(wait_for_propagation)
+            configure_agentcore(role_arn)
+            propagation.result()
+    else:
+        configure_agentcore(role_arn)
     deploy_agentcore()
 
     print()
@@ -5,69 +5,123 @@ Kullanim:
     python infra/invoke_agent.py "kritik stoklari goster"
     python infra/invoke_agent.py "WH001 icin stok durumu nedir?"
     python infra/invoke_agent.py "SKU001 icin transfer oner"
+    python infra/invoke_agent.py --stream "kritik stoklari goster"
 
 Not: .bedrock_agentcore.yaml dosyasindan ARN otomatik okunur.
      Yoksa AGENT_ARN env var kullanilir.
 """
 
+import asyncio
+import functools
 import json
 import sys
 import uuid
 import os
 
-import boto3
-import yaml
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:  # orjson opsiyonel; yoksa stdlib json
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+    _loads = json.loads
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import env_loader
+from _agent_config import agent_runtime_arn
 
 
 def get_agent_arn() -> str:
-    """ARN'i config dosyasindan veya env var'dan al."""
-    # Once env var
-    arn = os.environ.get("AGENT_ARN")
+    """ARN'i env var'dan veya config dosyasindan al; yoksa hata verip cik."""
+    arn = agent_runtime_arn()
     if arn:
         return arn
 
-    # .bedrock_agentcore.yaml'dan oku
-    config_path = ".bedrock_agentcore.yaml"
-    if os.path.exists(config_path):
-        with open(config_path) as f:
-            config = yaml.safe_load(f)
-        arn = config.get("bedrock_agentcore", {}).get("agent_runtime_arn")
-        if arn:
-            return arn
-
     print("HATA: Agent ARN bulunamadi.")
     print("  Ya AGENT_ARN env var ayarlayin ya da agentcore deploy yapin.")
     sys.exit(1)
 
 
-def invoke(prompt: str, session_id: str = None):
-    agent_arn = get_agent_arn()
-    session_id = session_id or str(uuid.uuid4())
+@functools.lru_cache(maxsize=1)
+def _client():
+    """Tekrarlanan invoke cagrilari ayni client'i ve keep-alive baglantilari kullanir.
 
-    client = boto3.client("bedrock-agentcore")
-    payload = json.dumps({"prompt": prompt, "session_id": session_id}).encode()
+    Client paylasilan session'dan ilk cagrida kurulur (boto3 o zaman yuklenir);
+    ARN/arguman hatasinda CLI boto3 yuklemeden cikar.
+    """
+    return env_loader.get_session().client(
+        "bedrock-agentcore",
+        verify=env_loader.VERIFY,
+        config=env_loader.get_boto_config(),
+    )
 
-    print(f"Agent ARN: {agent_arn}")
-    print(f"Session: {session_id}")
-    print(f"Prompt: {prompt}")
-    print("-" * 50)
 
-    response = client.invoke_agent_runtime(
-        agentRuntimeArn=agent_arn,
+def _iter_chunks(response):
+    """Runtime yanitini geldikce ham byte parcalari halinde verir."""
+    yield from response.get("response", [])
+
+
+def _invoke_raw(prompt: str, session_id: str, on_chunk=None) -> dict:
+    """Agent'i cagirip parse edilmis yaniti dondurur; stdout'a bir sey yazmaz.
+
+    on_chunk verilirse her ham byte parcasi geldikce ona iletilir.
+    """
+    payload = _dumps({"prompt": prompt, "session_id": session_id})
+    response = _client().invoke_agent_runtime(
+        agentRuntimeArn=get_agent_arn(),
         runtimeSessionId=session_id,
         payload=payload,
         qualifier="DEFAULT",
     )
 
-    content = []
-    for chunk in response.get("response", []):
-        content.append(chunk.decode("utf-8"))
+    # Parcalar byte olarak biriktirilir; decode tek seferde loads icinde yapilir
+    buf = bytearray()
+    for chunk in _iter_chunks(response):
+        buf += chunk
+        if on_chunk is not None:
+            on_chunk(chunk)
+    return _loads(bytes(buf))
+
 
-    result = json.loads("".join(content))
-    print(result.get("result", result))
+def _write_chunk(chunk: bytes):
+    sys.stdout.buffer.write(chunk)
+    sys.stdout.buffer.flush()
+
+
+def invoke(prompt: str, session_id: str = None, stream: bool = False):
+    """Agent'i cagirir. stream=True ise parcalar geldikce stdout'a yazilir."""
+    agent_arn = get_agent_arn()
+    session_id = session_id or str(uuid.uuid4())
+
+    print(f"Agent ARN: {agent_arn}")
+    print(f"Session: {session_id}")
+    print(f"Prompt: {prompt}")
+    print("-" * 50)
+
+    if stream:
+        sys.stdout.flush()  # metin katmanindaki basliklar ham byte'lardan once ciksin
+        result = _invoke_raw(prompt, session_id, on_chunk=_write_chunk)
+        sys.stdout.write("\n")
+    else:
+        result = _invoke_raw(prompt, session_id)
+        print(result.get("result", result))
     return result
 
 
+async def ainvoke(prompt: str, session_id: str = None):
+    """Async cagri; birden fazla prompt gather ile paralel gonderilebilir.
+
+    Yanit yazdirilmaz, parse edilmis sonuc doner; eszamanli cagrilarin ciktilari
+    birbirine karismaz.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _invoke_raw, prompt, session_id or str(uuid.uuid4()))
+
+
 if __name__ == "__main__":
-    prompt = " ".join(sys.argv[1:]) if len(sys.argv) > 1 else "Merhaba, sistem durumunu ozetle"
-    invoke(prompt)
+    args = sys.argv[1:]
+    stream = "--stream" in args
+    args = [a for a in args if a != "--stream"]
+    prompt = " ".join(args) if args else "Merhaba, sistem durumunu ozetle"
+    invoke(prompt, stream=stream)
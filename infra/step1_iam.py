@@ -2,8 +2,8 @@
 import os, json, sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 import env_loader
-import urllib3; urllib3.disable_warnings()
-import boto3
+from _iam_policy import policy_hash
+from _sts_cache import get_account_id_cached
 
 REGION = "us-west-2"
 ROLE_NAME = "BedrockAgentCore-WarehouseStockMgmt-ExecutionRole"
@@ -18,33 +18,48 @@ TRUST = json.dumps({
     }],
 })
 
-iam = boto3.client("iam", region_name=REGION, verify=False)
+iam = env_loader.get_session().client(
+    "iam",
+    region_name=REGION,
+    verify=env_loader.VERIFY,
+    config=env_loader.get_boto_config(),
+)
 
-# Role olustur veya mevcut olani kullan
+# Role olustur; zaten varsa ARN'i cache'lenmis account ID'den kur (get_role yok)
 try:
-    r = iam.get_role(RoleName=ROLE_NAME)
-    print(f"Role zaten mevcut: {r['Role']['Arn']}")
-except iam.exceptions.NoSuchEntityException:
     r = iam.create_role(
         RoleName=ROLE_NAME,
         AssumeRolePolicyDocument=TRUST,
         Description="AgentCore execution role for Warehouse Stock Management",
     )
-    print(f"Role olusturuldu: {r['Role']['Arn']}")
+    role_arn = r["Role"]["Arn"]
+    print(f"Role olusturuldu: {role_arn}")
+except iam.exceptions.EntityAlreadyExistsException:
+    role_arn = f"arn:aws:iam::{get_account_id_cached(REGION)}:role/{ROLE_NAME}"
+    print(f"Role zaten mevcut: {role_arn}")
 
-# Policy ekle
+# Policy ekle (icerik ayniysa yukleme)
 with open("infra/agentcore_execution_policy.json") as f:
     pol = f.read()
 
-iam.put_role_policy(
-    RoleName=ROLE_NAME,
-    PolicyName=POLICY_NAME,
-    PolicyDocument=pol,
-)
-print(f"Policy eklendi: {POLICY_NAME}")
 
-sts = boto3.client("sts", region_name=REGION, verify=False)
-account_id = sts.get_caller_identity()["Account"]
-role_arn = f"arn:aws:iam::{account_id}:role/{ROLE_NAME}"
+try:
+    existing = iam.get_role_policy(RoleName=ROLE_NAME, PolicyName=POLICY_NAME)["PolicyDocument"]
+except iam.exceptions.NoSuchEntityException:
+    existing = None
+
+if existing is not None and policy_hash(existing) == policy_hash(pol):
+    print(f"Policy degismemis, atlandi: {POLICY_NAME}")
+else:
+    iam.put_role_policy(
+        RoleName=ROLE_NAME,
+        PolicyName=POLICY_NAME,
+        PolicyDocument=pol,
+    )
+    print(f"Policy eklendi: {POLICY_NAME}")
+
+# Account ID'yi STS'e tekrar gitmeden role ARN'inden al (arn:aws:iam::<account>:role/...)
+account_id = role_arn.split(":")[4]
+print(f"Account: {account_id}")
 print(f"Role ARN: {role_arn}")
 print("IAM TAMAM - Adim 2'ye gecebilirsiniz")
@@ -5,27 +5,86 @@ Provides tools for sales history analysis, aging calculations, and predictive an
 Reads sales data from DynamoDB SalesHistory table and S3 for bulk data.
 """
 
+import asyncio
+import calendar
+import functools
+import hashlib
 import json
 import os
 import sys
+import tempfile
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 import env_loader
-import urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from data_layer import sales_cache
+from mcp_servers import ttl_cache
+from mcp_servers.ddb_batch import batch_get_with_backoff
 
 import boto3
+from concurrent.futures import ThreadPoolExecutor
 from io import StringIO
-from datetime import datetime, timedelta
+from operator import itemgetter
+from types import MappingProxyType
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 from typing import Dict, List, Optional
 from mcp.server import Server
 from mcp.types import Tool, TextContent
 
+try:
+    import orjson
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:  # orjson opsiyonel; yoksa stdlib json
+    def _dumps(obj) -> str:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+try:
+    from ciso8601 import parse_datetime as _parse_iso
+except ImportError:  # ciso8601 opsiyonel; yoksa stdlib fromisoformat
+    def _parse_iso(value: str) -> datetime:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_received(value: str) -> datetime:
+    """received_date parse'i; stoklar genelde ayni gunlerde girdigi icin tekrarlar cache'ten gelir."""
+    return _parse_iso(value)
+
+
 app = Server("analytics")
 
 REGION = os.environ.get("AWS_DEFAULT_REGION", "us-west-2")
-dynamodb = boto3.resource("dynamodb", region_name=REGION, verify=False)
-s3 = boto3.client("s3", region_name=REGION, verify=False)
+# Paralel sorgular (depo basina query, batch okuma) pool'da beklemesin; throttling'de adaptive retry
+_BOTO_CFG = env_loader.get_boto_config(max_pool_connections=64, retries={"mode": "adaptive", "max_attempts": 10})
+dynamodb = boto3.resource("dynamodb", region_name=REGION, verify=env_loader.VERIFY, config=_BOTO_CFG)
+s3 = boto3.client("s3", region_name=REGION, verify=env_loader.VERIFY, config=_BOTO_CFG)
+
+# Table handle'lari her tool cagrisinda yeniden kurulmasin
+SALES_TBL = dynamodb.Table("SalesHistory")
+INVENTORY_TBL = dynamodb.Table("Inventory")
+PRODUCTS_TBL = dynamodb.Table("Products")
+WAREHOUSES_TBL = dynamodb.Table("Warehouses")
+
+# Sabit referans tablolari (her cagrida yeniden kurulmasin)
+DEFAULT_AGING_THRESHOLD = 180
+CATEGORY_THRESHOLDS = MappingProxyType({
+    "Elektronik": 90, "Giyim": 180, "Gıda": 30, "Mobilya": 365,
+    "Kitap": 730, "Oyuncak": 180, "Spor Malzemeleri": 365,
+    "Ev Aletleri": 180, "Kozmetik": 365, "Otomotiv": 730
+})
+REGIONAL_MULTIPLIERS = MappingProxyType({
+    "Marmara": 1.5, "İç Anadolu": 1.2, "Ege": 1.3, "Akdeniz": 1.1, "Karadeniz": 1.0
+})
+SEASONAL_PATTERNS = MappingProxyType({
+    "Elektronik": {"high_season": (11, 12, 1), "multiplier": 2.5},
+    "Giyim": {"high_season": (9, 10, 11), "multiplier": 2.0},
+    "Gıda": {"high_season": (6, 7, 8), "multiplier": 1.5},
+})
+_NO_SEASON = MappingProxyType({"high_season": (), "multiplier": 1.0})
+# Referans tool'lari agent'tan gelen serbest string'lerle cagrilir; cache
+# sinirli tutulur. Cache'lenen sonuclar paylasildigi icin salt-okunur doner.
+REFERENCE_CACHE_SIZE = 256
 
 # S3 bucket name: warehouse-stock-mgmt-{account_id}
 S3_BUCKET = None
@@ -33,23 +92,83 @@ S3_BUCKET = None
 def _get_bucket():
     global S3_BUCKET
     if S3_BUCKET is None:
-        sts = boto3.client("sts", region_name=REGION, verify=False)
+        sts = boto3.client("sts", region_name=REGION, verify=env_loader.VERIFY, config=_BOTO_CFG)
         account_id = sts.get_caller_identity()["Account"]
         S3_BUCKET = f"warehouse-stock-mgmt-{account_id}"
     return S3_BUCKET
 
 
+BATCH_GET_LIMIT = 100
+
+
+def _batch_get_many(request_items: Dict[str, List[Dict]]) -> Dict[str, List[Dict]]:
+    """Birden fazla tablodan tek BatchGetItem ile okur (toplam <=100 anahtar).
+
+    Bos anahtar listesi verilen tablolar istege girmez, sonucta bos liste olarak doner.
+    """
+    results: Dict[str, List[Dict]] = {name: [] for name in request_items}
+    request = {name: {"Keys": keys} for name, keys in request_items.items() if keys}
+    results.update(batch_get_with_backoff(dynamodb, request))
+    return results
+
+
+def _batch_get(table_name: str, keys: List[Dict]) -> List[Dict]:
+    """Tek tablodan BatchGetItem ile 100'erli gruplar halinde okur."""
+    items = []
+    for i in range(0, len(keys), BATCH_GET_LIMIT):
+        items.extend(_batch_get_many({table_name: keys[i:i + BATCH_GET_LIMIT]})[table_name])
+    return items
+
+
+# Products/Warehouses referans verisi nadiren degisir; tool cagrilari arasinda
+# ayni sku/warehouse icin tekrar GetItem atilmasin diye kisa TTL'li cache
+CACHE_TTL_SECONDS = 300
+_product_cache: Dict[str, tuple] = {}
+_warehouse_cache: Dict[str, tuple] = {}
+
+
+def _get_product(sku: str) -> Optional[Dict]:
+    return ttl_cache.get_or_load(_product_cache, sku, lambda: PRODUCTS_TBL.get_item(Key={"sku": sku}).get("Item"),
+                                 CACHE_TTL_SECONDS)
+
+
+def _get_warehouse(warehouse_id: str) -> Optional[Dict]:
+    return ttl_cache.get_or_load(
+        _warehouse_cache, warehouse_id,
+        lambda: WAREHOUSES_TBL.get_item(Key={"warehouse_id": warehouse_id}).get("Item"),
+        CACHE_TTL_SECONDS,
+    )
+
+
 def _to_json(obj):
     if isinstance(obj, Decimal):
         return int(obj) if obj == int(obj) else float(obj)
-    if isinstance(obj, dict):
+    if isinstance(obj, (dict, MappingProxyType)):
         return {k: _to_json(v) for k, v in obj.items()}
     if isinstance(obj, list):
         return [_to_json(i) for i in obj]
     return obj
 
-def _result(data):
-    return [TextContent(type="text", text=json.dumps(_to_json(data), indent=2, ensure_ascii=False))]
+RESULT_CHUNK_SIZE = 500
+# Parcali yanit sadece bu tool'larda; digerleri (or. get_sales_history) her
+# zaman tek TextContent doner, mevcut istemcilerin okudugu sekil degismez
+CHUNKED_TOOLS = frozenset({"prioritize_aged_stock"})
+
+
+def _result(data, chunked: bool = False):
+    # Yanitlar agent'a gidiyor; girintisiz (compact) JSON daha kisa ve hizli
+    rows = data.get("data") if chunked and isinstance(data, dict) else None
+    if not isinstance(rows, list) or len(rows) <= RESULT_CHUNK_SIZE:
+        return [TextContent(type="text", text=_dumps(_to_json(data)))]
+
+    # Buyuk listeler tek dev JSON yerine once ozet (data haric alanlar + chunks),
+    # sonra RESULT_CHUNK_SIZE'lik parcalar halinde ayri TextContent'lerle doner
+    header = {k: v for k, v in data.items() if k != "data"}
+    header["chunks"] = -(-len(rows) // RESULT_CHUNK_SIZE)
+    contents = [TextContent(type="text", text=_dumps(_to_json(header)))]
+    for i in range(0, len(rows), RESULT_CHUNK_SIZE):
+        contents.append(TextContent(type="text", text=_dumps(_to_json(rows[i:i + RESULT_CHUNK_SIZE]))))
+    return contents
 
 
 @app.list_tools()
@@ -70,11 +189,17 @@ async def list_tools() -> List[Tool]:
              }, "required": ["warehouse_id", "sku"]}),
         Tool(name="get_category_threshold", description="Get aging threshold for a product category",
              inputSchema={"type": "object", "properties": {"category": {"type": "string"}}, "required": ["category"]}),
-        Tool(name="prioritize_aged_stock", description="Get list of aged stock items prioritized by aging severity",
+        Tool(name="prioritize_aged_stock",
+             description="Get list of aged stock items prioritized by aging severity. "
+                         "Over 500 items: first content is the summary with a 'chunks' count (no 'data'), "
+                         "followed by that many contents each holding a JSON array of up to 500 items.",
              inputSchema={"type": "object", "properties": {
                  "warehouse_id": {"type": "string", "description": "Optional"}, "category": {"type": "string", "description": "Optional"}
              }}),
-        Tool(name="predict_demand", description="Predict future demand for a SKU based on historical data",
+        Tool(name="predict_demand",
+             description="Predict future demand for a SKU based on historical data (Holt trend smoothing over daily totals). "
+                         "avg_daily_sales is per calendar day from the first sale in the window to today, "
+                         "days without sales counting as 0.",
              inputSchema={"type": "object", "properties": {
                  "sku": {"type": "string"}, "warehouse_id": {"type": "string"},
                  "forecast_days": {"type": "integer", "default": 30}
@@ -93,63 +218,156 @@ async def list_tools() -> List[Tool]:
     ]
 
 
+# Tool adi -> handler; her call_tool cagrisinda yeniden kurulmaz
+TOOL_DISPATCH = {
+    "get_sales_history": lambda a: get_sales_history(a["sku"], a.get("warehouse_id"), a.get("months", 12)),
+    "calculate_sales_potential": lambda a: calculate_sales_potential(a["sku"], a["warehouse_id"]),
+    "get_aging_data": lambda a: get_aging_data(a["warehouse_id"], a["sku"]),
+    "get_category_threshold": lambda a: get_category_threshold(a["category"]),
+    "prioritize_aged_stock": lambda a: prioritize_aged_stock(a.get("warehouse_id"), a.get("category")),
+    "predict_demand": lambda a: predict_demand(a["sku"], a["warehouse_id"], a.get("forecast_days", 30)),
+    "get_regional_sales_multiplier": lambda a: get_regional_sales_multiplier(a["region"]),
+    "calculate_transfer_priority": lambda a: calculate_transfer_priority(a["sku"], a["source_warehouse_id"], a["target_warehouse_id"], a["quantity"]),
+    "get_seasonal_multiplier": lambda a: get_seasonal_multiplier(a["category"], a["month"]),
+}
+
+
 @app.call_tool()
 async def call_tool(name: str, arguments: dict) -> List[TextContent]:
-    handlers = {
-        "get_sales_history": lambda a: get_sales_history(a["sku"], a.get("warehouse_id"), a.get("months", 12)),
-        "calculate_sales_potential": lambda a: calculate_sales_potential(a["sku"], a["warehouse_id"]),
-        "get_aging_data": lambda a: get_aging_data(a["warehouse_id"], a["sku"]),
-        "get_category_threshold": lambda a: get_category_threshold(a["category"]),
-        "prioritize_aged_stock": lambda a: prioritize_aged_stock(a.get("warehouse_id"), a.get("category")),
-        "predict_demand": lambda a: predict_demand(a["sku"], a["warehouse_id"], a.get("forecast_days", 30)),
-        "get_regional_sales_multiplier": lambda a: get_regional_sales_multiplier(a["region"]),
-        "calculate_transfer_priority": lambda a: calculate_transfer_priority(a["sku"], a["source_warehouse_id"], a["target_warehouse_id"], a["quantity"]),
-        "get_seasonal_multiplier": lambda a: get_seasonal_multiplier(a["category"], a["month"]),
-    }
-    handler = handlers.get(name)
+    handler = TOOL_DISPATCH.get(name)
     if not handler:
         raise ValueError(f"Unknown tool: {name}")
-    return _result(handler(arguments))
+    # Handler'lar bloklayan boto3 cagrilari yapiyor; event loop'u tutmasinlar
+    # diye thread'de calistir, eszamanli tool cagrilari I/O'yu ortusturebilsin
+    return _result(await asyncio.to_thread(handler, arguments), chunked=name in CHUNKED_TOOLS)
 
 
 # --- Implementation ---
 
-def get_sales_history(sku: str, warehouse_id: Optional[str] = None, months: int = 12) -> Dict:
-    """SalesHistory tablosundan satis verisi ceker. PK=warehouse_id, SK=date_sku (format: 2024-06-15#SKU001)"""
+def _window_start(months: int) -> str:
+    """Bugunden `months` takvim ayi onceki gunu YYYY-MM-DD olarak dondurur.
+
+    Ay aritmetigi tamsayi (yil*12 + ay) uzerinden yapilir; hedef ayda o gun
+    yoksa (or. 31 -> Subat) ayin son gunune kirpilir.
+    """
+    today = datetime.now()
+    ym = today.year * 12 + (today.month - 1) - months
+    year, month = ym // 12, ym % 12 + 1
+    day = min(today.day, calendar.monthrange(year, month)[1])
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+# Ic hesaplamalar (potansiyel, talep tahmini) sadece tarih ve miktar kullanir
+SALES_QTY_FIELDS = ("date_sku", "quantity_sold")
+_QTY = itemgetter("quantity_sold")
+
+
+def _query_sales_range(warehouse_id: str, sku: str, start_str: str, end_str: Optional[str] = None,
+                       fields: Optional[tuple] = None) -> List[Dict]:
+    """Tek deponun SKU satislarini [start_str, end_str) araliginda sayfalayarak ceker.
+
+    fields verilirse sadece o attribute'lar doner.
+    """
+    from boto3.dynamodb.conditions import Key, Attr
+    if end_str:
+        date_cond = Key("date_sku").between(f"{start_str}#", f"{end_str}#")
+    else:
+        date_cond = Key("date_sku").gte(f"{start_str}#")
+    kwargs = {
+        "KeyConditionExpression": Key("warehouse_id").eq(warehouse_id) & date_cond,
+        "FilterExpression": Attr("sku").eq(sku),
+    }
+    if fields:
+        names = {f"#f{i}": f for i, f in enumerate(fields)}
+        kwargs["ProjectionExpression"] = ", ".join(names)
+        kwargs["ExpressionAttributeNames"] = names
+    resp = SALES_TBL.query(**kwargs)
+    items = resp.get("Items", [])
+    while "LastEvaluatedKey" in resp:
+        resp = SALES_TBL.query(**kwargs, ExclusiveStartKey=resp["LastEvaluatedKey"])
+        items.extend(resp.get("Items", []))
+    return items
+
+
+# Kapanmis aylarin satislari degismez; bu kisim diskte tutulur ve sadece
+# icinde bulunulan ay DynamoDB'den okunur. SalesHistory yeniden yuklendiginde
+# (reload_sales, setup_aws) sales_cache.bump_version() versiyonu degistirir;
+# girdiler versiyon alt dizininde oldugu icin eskiler okunmaz ve silinir.
+def _sales_cache_path(version: str, warehouse_id: str, sku: str, fields: Optional[tuple]) -> str:
+    # Farkli region/tablo ayni dizini paylasabilir; anahtar ikisini de icerir
+    key = f"{REGION}|{SALES_TBL.name}|{warehouse_id}|{sku}|{','.join(fields or ())}"
+    return os.path.join(sales_cache.version_dir(version), hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+
+def _write_sales_cache(path: str, entry: Dict) -> None:
+    # Ayni anda calisan prosesler yarim dosya okumasin diye tmp + replace
+    directory = os.path.dirname(path)
     try:
-        from boto3.dynamodb.conditions import Key, Attr
-        table = dynamodb.Table("SalesHistory")
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=months * 30)
-        start_str = start_date.strftime("%Y-%m-%d")
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+def _query_sales(warehouse_id: str, sku: str, start_str: str,
+                 fields: Optional[tuple] = None) -> List[Dict]:
+    """Tek deponun SKU satislari; kapanmis aylar disk cache'inden, bu ay DynamoDB'den."""
+    month_start = datetime.now().strftime("%Y-%m-01")
+    if start_str >= month_start:
+        return _query_sales_range(warehouse_id, sku, start_str, fields=fields)
+
+    # Versiyon sorgudan once okunur; sorgu sirasinda yeniden yukleme olursa
+    # girdi eski versiyonun dizinine yazilir ve bir daha okunmaz
+    version = sales_cache.read_version()
+    path = _sales_cache_path(version, warehouse_id, sku, fields)
+    closed = None
+    try:
+        with open(path, encoding="utf-8") as f:
+            cached = json.load(f)
+        if (cached.get("version") == version and cached["from"] <= start_str
+                and cached["until"] == month_start):
+            closed = [r for r in cached["items"] if r["date_sku"] >= start_str]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    if closed is None:
+        closed = _to_json(_query_sales_range(warehouse_id, sku, start_str, month_start, fields))
+        _write_sales_cache(path, {"version": version, "from": start_str, "until": month_start, "items": closed})
+
+    return closed + _query_sales_range(warehouse_id, sku, month_start, fields=fields)
 
-        sales_data = []
+
+def get_sales_history(sku: str, warehouse_id: Optional[str] = None, months: int = 12,
+                      fields: Optional[tuple] = None) -> Dict:
+    """SalesHistory tablosundan satis verisi ceker. PK=warehouse_id, SK=date_sku (format: 2024-06-15#SKU001)
+
+    SKU filtresi DynamoDB tarafinda (FilterExpression) uygulanir; fields ile
+    sadece gereken attribute'lar (or. quantity_sold) tasinir.
+    """
+    try:
+        start_str = _window_start(months)
 
         if warehouse_id:
             # Query tek depo
-            resp = table.query(
-                KeyConditionExpression=Key("warehouse_id").eq(warehouse_id) & Key("date_sku").gte(f"{start_str}#"),
-                FilterExpression=Attr("sku").eq(sku)
-            )
-            sales_data.extend(resp.get("Items", []))
-            while "LastEvaluatedKey" in resp:
-                resp = table.query(
-                    KeyConditionExpression=Key("warehouse_id").eq(warehouse_id) & Key("date_sku").gte(f"{start_str}#"),
-                    FilterExpression=Attr("sku").eq(sku),
-                    ExclusiveStartKey=resp["LastEvaluatedKey"]
-                )
-                sales_data.extend(resp.get("Items", []))
+            sales_data = _query_sales(warehouse_id, sku, start_str, fields)
         else:
-            # Tum depolar icin scan (warehouse listesinden query)
-            wh_table = dynamodb.Table("Warehouses")
-            wh_resp = wh_table.scan(ProjectionExpression="warehouse_id")
-            for wh in wh_resp.get("Items", []):
-                wid = wh["warehouse_id"]
-                resp = table.query(
-                    KeyConditionExpression=Key("warehouse_id").eq(wid) & Key("date_sku").gte(f"{start_str}#"),
-                    FilterExpression=Attr("sku").eq(sku)
-                )
-                sales_data.extend(resp.get("Items", []))
+            # Tum depolar: her depo icin query, depolar paralel
+            wh_resp = WAREHOUSES_TBL.scan(ProjectionExpression="warehouse_id")
+            wids = [wh["warehouse_id"] for wh in wh_resp.get("Items", [])]
+            sales_data = []
+            if wids:
+                with ThreadPoolExecutor(max_workers=min(len(wids), 16)) as executor:
+                    for items in executor.map(lambda wid: _query_sales(wid, sku, start_str, fields), wids):
+                        sales_data.extend(items)
 
         return {"success": True, "sku": sku, "warehouse_id": warehouse_id, "months": months,
                 "data_points": len(sales_data), "data": sales_data}
@@ -157,22 +375,55 @@ def get_sales_history(sku: str, warehouse_id: Optional[str] = None, months: int
         return {"success": False, "error": str(e), "data": []}
 
 
+# calculate_sales_potential (3 ay) ve predict_demand (6 ay) ayni (sku, depo)
+# icin tek bir 6 aylik okumayi paylasir; kisa pencere yerelde kesilir
+HISTORY_WINDOW_MONTHS = 6
+HISTORY_TTL_SECONDS = 60
+_history_cache: Dict[tuple, tuple] = {}
+
+
+def _load_sales_window(sku: str, warehouse_id: str) -> Dict:
+    """6 aylik pencereyi ceker; miktarlar cache'e girmeden bir kez float'a cevrilir."""
+    history = get_sales_history(sku, warehouse_id, HISTORY_WINDOW_MONTHS, fields=SALES_QTY_FIELDS)
+    if history["success"]:
+        history["data"] = [{"date_sku": r["date_sku"], "quantity_sold": float(r.get("quantity_sold", 0))}
+                           for r in history["data"]]
+    return history
+
+
+def _recent_sales(sku: str, warehouse_id: str, months: int) -> Dict:
+    """Son `months` ayin satislarini (tarih + miktar) cache'lenmis 6 aylik pencereden dondurur."""
+    key = (sku, warehouse_id)
+    history = ttl_cache.get_or_load(_history_cache, key, lambda: _load_sales_window(sku, warehouse_id),
+                                    HISTORY_TTL_SECONDS)
+    if not history["success"]:
+        _history_cache.pop(key, None)
+        return history
+    if months >= HISTORY_WINDOW_MONTHS:
+        return history
+
+    start_str = _window_start(months)
+    data = [r for r in history["data"] if r["date_sku"] >= start_str]
+    return {**history, "months": months, "data_points": len(data), "data": data}
+
+
+def _sales_potential_score(rows: List[Dict], region: str) -> tuple:
+    """Son 3 ayin satislarindan (skor, gunluk ortalama, bolge carpani) hesaplar."""
+    total_sales = sum(map(_QTY, rows))
+    avg_daily = total_sales / 90
+    mult = get_regional_sales_multiplier(region)["multiplier"]
+    return min(avg_daily * 10, 100) * mult, avg_daily, mult
+
+
 def calculate_sales_potential(sku: str, warehouse_id: str) -> Dict:
     try:
-        history = get_sales_history(sku, warehouse_id, months=3)
+        history = _recent_sales(sku, warehouse_id, months=3)
         if not history["success"] or not history["data"]:
             return {"success": False, "error": "No sales history", "score": 0}
 
-        total_sales = sum(float(r.get("quantity_sold", 0)) for r in history["data"])
-        avg_daily = total_sales / 90
-
-        wh_table = dynamodb.Table("Warehouses")
-        wh_resp = wh_table.get_item(Key={"warehouse_id": warehouse_id})
-        region = wh_resp["Item"].get("region", "") if "Item" in wh_resp else ""
-        mult = get_regional_sales_multiplier(region)["multiplier"]
-
-        base = min(avg_daily * 10, 100)
-        score = base * mult
+        wh = _get_warehouse(warehouse_id)
+        region = wh.get("region", "") if wh else ""
+        score, avg_daily, mult = _sales_potential_score(history["data"], region)
         return {"success": True, "sku": sku, "warehouse_id": warehouse_id,
                 "score": round(score, 2), "avg_daily_sales": round(avg_daily, 2),
                 "regional_multiplier": mult, "region": region}
@@ -180,26 +431,29 @@ def calculate_sales_potential(sku: str, warehouse_id: str) -> Dict:
         return {"success": False, "error": str(e), "score": 0}
 
 
+def _aging_metrics(received: Optional[str], category: str) -> tuple:
+    """(yas gunu, kategori esigi, esige gore yuzde) dondurur."""
+    if received:
+        rd = _parse_received(received)
+        aging_days = (datetime.now(rd.tzinfo) - rd).days
+    else:
+        aging_days = 0
+    threshold = CATEGORY_THRESHOLDS.get(category, DEFAULT_AGING_THRESHOLD)
+    pct = (aging_days / threshold * 100) if threshold > 0 else 0
+    return aging_days, threshold, pct
+
+
 def get_aging_data(warehouse_id: str, sku: str) -> Dict:
     try:
-        inv_table = dynamodb.Table("Inventory")
-        resp = inv_table.get_item(Key={"warehouse_id": warehouse_id, "sku": sku})
+        resp = INVENTORY_TBL.get_item(Key={"warehouse_id": warehouse_id, "sku": sku})
         if "Item" not in resp:
             return {"success": False, "error": "Inventory item not found", "data": None}
 
         item = resp["Item"]
         received = item.get("received_date")
-        if received:
-            rd = datetime.fromisoformat(received.replace("Z", "+00:00"))
-            aging_days = (datetime.now(rd.tzinfo) - rd).days
-        else:
-            aging_days = 0
-
-        prod_table = dynamodb.Table("Products")
-        prod_resp = prod_table.get_item(Key={"sku": sku})
-        category = prod_resp["Item"].get("category", "") if "Item" in prod_resp else ""
-        threshold = get_category_threshold(category)["threshold_days"]
-        pct = (aging_days / threshold * 100) if threshold > 0 else 0
+        product = _get_product(sku)
+        category = product.get("category", "") if product else ""
+        aging_days, threshold, pct = _aging_metrics(received, category)
 
         return {"success": True, "data": {
             "warehouse_id": warehouse_id, "sku": sku, "aging_days": aging_days,
@@ -210,94 +464,211 @@ def get_aging_data(warehouse_id: str, sku: str) -> Dict:
         return {"success": False, "error": str(e), "data": None}
 
 
-def get_category_threshold(category: str) -> Dict:
-    thresholds = {
-        "Elektronik": 90, "Giyim": 180, "Gıda": 30, "Mobilya": 365,
-        "Kitap": 730, "Oyuncak": 180, "Spor Malzemeleri": 365,
-        "Ev Aletleri": 180, "Kozmetik": 365, "Otomotiv": 730
-    }
-    return {"success": True, "category": category, "threshold_days": thresholds.get(category, 180)}
+@functools.lru_cache(maxsize=REFERENCE_CACHE_SIZE)
+def get_category_threshold(category: str) -> MappingProxyType:
+    threshold = CATEGORY_THRESHOLDS.get(category, DEFAULT_AGING_THRESHOLD)
+    return MappingProxyType({"success": True, "category": category, "threshold_days": threshold})
+
+
+def _query_category_products(category: str) -> List[Dict]:
+    """Products.CategoryIndex GSI uzerinden kategorideki urunleri ceker."""
+    from boto3.dynamodb.conditions import Key
+    kwargs = {"IndexName": "CategoryIndex", "KeyConditionExpression": Key("category").eq(category)}
+    resp = PRODUCTS_TBL.query(**kwargs)
+    items = resp.get("Items", [])
+    while "LastEvaluatedKey" in resp:
+        resp = PRODUCTS_TBL.query(**kwargs, ExclusiveStartKey=resp["LastEvaluatedKey"])
+        items.extend(resp.get("Items", []))
+    return items
 
 
 def prioritize_aged_stock(warehouse_id: Optional[str] = None, category: Optional[str] = None) -> Dict:
     try:
         from boto3.dynamodb.conditions import Key
-        inv_table = dynamodb.Table("Inventory")
+        products = None
         if warehouse_id:
-            resp = inv_table.query(KeyConditionExpression=Key("warehouse_id").eq(warehouse_id))
+            resp = INVENTORY_TBL.query(KeyConditionExpression=Key("warehouse_id").eq(warehouse_id))
             items = resp.get("Items", [])
+        elif category:
+            # Inventory'de kategori yok; tam tablo scan'i yerine kategorinin SKU'larini
+            # Products.CategoryIndex'ten alip (depo, sku) anahtarlarini toplu oku
+            products = _query_category_products(category)
+            wh_resp = WAREHOUSES_TBL.scan(ProjectionExpression="warehouse_id")
+            keys = [{"warehouse_id": wh["warehouse_id"], "sku": p["sku"]}
+                    for wh in wh_resp.get("Items", []) for p in products]
+            items = _batch_get("Inventory", keys)
         else:
-            resp = inv_table.scan()
+            resp = INVENTORY_TBL.scan()
             items = resp.get("Items", [])
             while "LastEvaluatedKey" in resp:
-                resp = inv_table.scan(ExclusiveStartKey=resp["LastEvaluatedKey"])
+                resp = INVENTORY_TBL.scan(ExclusiveStartKey=resp["LastEvaluatedKey"])
                 items.extend(resp.get("Items", []))
 
+        # Urun kategorileri tek tek GetItem yerine benzersiz SKU'lar uzerinden toplu okunur
+        if products is None:
+            unique_skus = {item["sku"] for item in items}
+            products = _batch_get("Products", [{"sku": sku} for sku in unique_skus])
+        for p in products:
+            ttl_cache.put(_product_cache, p["sku"], p, CACHE_TTL_SECONDS)
+        # Kategori/esik SKU basina, yas gunu ise farkli received_date basina bir kez hesaplanir;
+        # satir dongusu sadece sozluk aramasi yapar
+        sku_info = {}
+        for p in products:
+            cat = p.get("category", "")
+            if category and cat != category:
+                continue
+            sku_info[p["sku"]] = (cat, CATEGORY_THRESHOLDS.get(cat, DEFAULT_AGING_THRESHOLD))
+        if not category:
+            default_info = ("", DEFAULT_AGING_THRESHOLD)
+            for item in items:
+                sku_info.setdefault(item["sku"], default_info)
+
+        # "Simdi" cagri basina bir kez alinir (tz'li ve naive tarihler icin)
+        now_utc = datetime.now(timezone.utc)
+        now_naive = datetime.now()
+        aging_by_received = {}
+        for received in {item.get("received_date") for item in items}:
+            if received:
+                rd = _parse_received(received)
+                now = now_naive if rd.tzinfo is None else now_utc
+                aging_by_received[received] = (now - rd).days
+            else:
+                aging_by_received[received] = 0
+
         aged = []
         for item in items:
-            ad = get_aging_data(item["warehouse_id"], item["sku"])
-            if not ad["success"]:
+            info = sku_info.get(item["sku"])
+            if info is None:
                 continue
-            info = ad["data"]
-            if category and info.get("category") != category:
-                continue
-            if info["aging_percentage"] > 50:
+            cat, threshold = info
+            aging_days = aging_by_received[item.get("received_date")]
+            pct = round(aging_days / threshold * 100, 2)
+            if pct > 50:
                 aged.append({
                     "warehouse_id": item["warehouse_id"], "sku": item["sku"],
-                    "quantity": item.get("quantity", 0), "aging_days": info["aging_days"],
-                    "aging_percentage": info["aging_percentage"], "is_critical": info["is_critical"],
-                    "category": info["category"]
+                    "quantity": item.get("quantity", 0), "aging_days": aging_days,
+                    "aging_percentage": pct, "is_critical": aging_days >= threshold,
+                    "category": cat
                 })
-        aged.sort(key=lambda x: x["aging_percentage"], reverse=True)
+        aged.sort(key=itemgetter("aging_percentage"), reverse=True)
         return {"success": True, "count": len(aged), "data": aged}
     except Exception as e:
         return {"success": False, "error": str(e), "data": []}
 
 
+# Holt (trend'li ustel duzeltme) parametreleri; yakin gunlere daha fazla agirlik verir
+HOLT_ALPHA = 0.3
+HOLT_BETA = 0.1
+HOLT_MIN_POINTS = 14
+
+
+def _daily_series(rows: List[Dict]) -> List[float]:
+    """Satis kayitlarini ilk satis gunuden bugune gunluk toplamlara cevirir (bos gunler 0)."""
+    daily: Dict[str, float] = {}
+    for r in rows:
+        day = r["date_sku"][:10]
+        daily[day] = daily.get(day, 0.0) + r["quantity_sold"]
+    first = datetime.fromisoformat(min(daily)).date()
+    last = max(datetime.fromisoformat(max(daily)).date(), datetime.now().date())
+    return [daily.get((first + timedelta(days=i)).isoformat(), 0.0)
+            for i in range((last - first).days + 1)]
+
+
+def _holt_forecast(series: List[float], horizon: int) -> tuple:
+    """Holt lineer trend ile `horizon` gunluk toplam talebi ve in-sample hata std'sini dondurur.
+
+    Kisa serilerde trend guvenilir olmadigindan basit ustel duzeltmeye (SES) duser.
+    """
+    use_trend = len(series) >= HOLT_MIN_POINTS
+    level, trend = series[0], 0.0
+    sq_err = 0.0
+    for x in series[1:]:
+        forecast = level + trend
+        sq_err += (x - forecast) ** 2
+        prev_level = level
+        level = HOLT_ALPHA * x + (1 - HOLT_ALPHA) * forecast
+        if use_trend:
+            trend = HOLT_BETA * (level - prev_level) + (1 - HOLT_BETA) * trend
+
+    total = sum(max(level + h * trend, 0.0) for h in range(1, horizon + 1))
+    resid_std = (sq_err / (len(series) - 1)) ** 0.5 if len(series) > 1 else 0.0
+    return total, resid_std
+
+
+def _confidence(resid_std: float, avg_daily: float) -> str:
+    if avg_daily <= 0:
+        return "low"
+    cv = resid_std / avg_daily
+    return "high" if cv < 0.5 else "medium" if cv < 1.0 else "low"
+
+
 def predict_demand(sku: str, warehouse_id: str, forecast_days: int = 30) -> Dict:
     try:
-        history = get_sales_history(sku, warehouse_id, months=6)
+        history = _recent_sales(sku, warehouse_id, months=6)
         if not history["success"] or not history["data"]:
             return {"success": False, "error": "Insufficient sales history", "predicted_demand": 0}
 
-        total = sum(float(r.get("quantity_sold", 0)) for r in history["data"])
-        days = len(history["data"])
-        avg_daily = total / days if days > 0 else 0
-        predicted = avg_daily * forecast_days
+        series = _daily_series(history["data"])
+        avg_daily = sum(series) / len(series)
+        predicted, resid_std = _holt_forecast(series, forecast_days)
 
         month = datetime.now().month
-        prod_table = dynamodb.Table("Products")
-        prod_resp = prod_table.get_item(Key={"sku": sku})
-        if "Item" in prod_resp:
-            cat = prod_resp["Item"].get("category", "")
+        product = _get_product(sku)
+        if product:
+            cat = product.get("category", "")
             sm = get_seasonal_multiplier(cat, month)
             predicted *= sm.get("multiplier", 1.0)
 
         return {"success": True, "sku": sku, "warehouse_id": warehouse_id,
                 "forecast_days": forecast_days, "predicted_demand": round(predicted, 2),
-                "avg_daily_sales": round(avg_daily, 2), "confidence": "medium"}
+                "avg_daily_sales": round(avg_daily, 2), "confidence": _confidence(resid_std, avg_daily)}
     except Exception as e:
         return {"success": False, "error": str(e), "predicted_demand": 0}
 
 
-def get_regional_sales_multiplier(region: str) -> Dict:
-    mults = {"Marmara": 1.5, "İç Anadolu": 1.2, "Ege": 1.3, "Akdeniz": 1.1, "Karadeniz": 1.0}
-    return {"success": True, "region": region, "multiplier": mults.get(region, 1.0)}
+@functools.lru_cache(maxsize=REFERENCE_CACHE_SIZE)
+def get_regional_sales_multiplier(region: str) -> MappingProxyType:
+    return MappingProxyType({"success": True, "region": region, "multiplier": REGIONAL_MULTIPLIERS.get(region, 1.0)})
 
 
 def calculate_transfer_priority(sku: str, source_wh: str, target_wh: str, quantity: int) -> Dict:
     try:
-        sp = calculate_sales_potential(sku, target_wh)
-        sales_score = sp.get("score", 0)
+        # Satis gecmisi okunurken Inventory/Products/Warehouses tek BatchGetItem ile alinir.
+        # BatchGetItem ayni anahtari iki kez kabul etmez (ValidationException);
+        # source_wh == target_wh ise Inventory anahtari tek gider.
+        inventory_keys = [{"warehouse_id": wh, "sku": sku} for wh in dict.fromkeys((source_wh, target_wh))]
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            history_future = executor.submit(_recent_sales, sku, target_wh, 3)
+            batch = _batch_get_many({
+                "Inventory": inventory_keys,
+                "Products": [{"sku": sku}],
+                "Warehouses": [{"warehouse_id": target_wh}],
+            })
+            history = history_future.result()
+
+        inventory = {it["warehouse_id"]: it for it in batch["Inventory"]}
+        product = batch["Products"][0] if batch["Products"] else None
+        warehouse = batch["Warehouses"][0] if batch["Warehouses"] else None
+        ttl_cache.put(_product_cache, sku, product, CACHE_TTL_SECONDS)
+        ttl_cache.put(_warehouse_cache, target_wh, warehouse, CACHE_TTL_SECONDS)
+
+        if history["success"] and history["data"]:
+            region = warehouse.get("region", "") if warehouse else ""
+            sales_score = _sales_potential_score(history["data"], region)[0]
+        else:
+            sales_score = 0
 
-        ad = get_aging_data(source_wh, sku)
-        aging_score = min(ad["data"]["aging_percentage"], 100) if ad["success"] else 0
+        src = inventory.get(source_wh)
+        if src:
+            category = product.get("category", "") if product else ""
+            aging_score = min(_aging_metrics(src.get("received_date"), category)[2], 100)
+        else:
+            aging_score = 0
 
-        inv_table = dynamodb.Table("Inventory")
-        tgt = inv_table.get_item(Key={"warehouse_id": target_wh, "sku": sku})
-        if "Item" in tgt:
-            cur = tgt["Item"].get("quantity", 0)
-            mn = tgt["Item"].get("min_threshold", 0)
+        tgt = inventory.get(target_wh)
+        if tgt:
+            cur = tgt.get("quantity", 0)
+            mn = tgt.get("min_threshold", 0)
             deficit = max(0, mn - cur) if isinstance(mn, (int, float)) and isinstance(cur, (int, float)) else 0
             urgency = min((deficit / mn * 100) if mn > 0 else 0, 100)
         else:
@@ -312,19 +683,15 @@ def calculate_transfer_priority(sku: str, source_wh: str, target_wh: str, quanti
         return {"success": False, "error": str(e), "priority_score": 0}
 
 
-def get_seasonal_multiplier(category: str, month: int) -> Dict:
-    patterns = {
-        "Elektronik": {"high_season": [11, 12, 1], "multiplier": 2.5},
-        "Giyim": {"high_season": [9, 10, 11], "multiplier": 2.0},
-        "Gıda": {"high_season": [6, 7, 8], "multiplier": 1.5},
-    }
-    p = patterns.get(category, {"high_season": [], "multiplier": 1.0})
+@functools.lru_cache(maxsize=REFERENCE_CACHE_SIZE)
+def get_seasonal_multiplier(category: str, month: int) -> MappingProxyType:
+    p = SEASONAL_PATTERNS.get(category, _NO_SEASON)
     m = p["multiplier"] if month in p["high_season"] else 1.0
-    return {"success": True, "category": category, "month": month, "multiplier": m, "is_high_season": month in p["high_season"]}
+    return MappingProxyType({"success": True, "category": category, "month": month,
+                             "multiplier": m, "is_high_season": month in p["high_season"]})
 
 
 if __name__ == "__main__":
-    import asyncio
     from mcp.server.stdio import stdio_server
 
     async def run():
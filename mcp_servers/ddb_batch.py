@@ -0,0 +1,27 @@
+"""MCP server'larinin ortak DynamoDB BatchGetItem yardimcisi."""
+import random
+import time
+from typing import Dict, List
+
+BACKOFF_BASE_SECONDS = 0.05
+BACKOFF_MAX_SECONDS = 2.0
+
+
+def batch_get_with_backoff(client_or_resource, request: Dict) -> Dict[str, List[Dict]]:
+    """RequestItems'i BatchGetItem ile okur; tablo adi -> kayit listesi dondurur.
+
+    boto3 client (ham attribute-value) veya resource (Python tipleri) kabul eder.
+    UnprocessedKeys (throttling) artan, jitter'li beklemeyle tekrar denenir.
+    Istek BatchGetItem sinirlari (100 anahtar) icinde olmalidir.
+    """
+    results: Dict[str, List[Dict]] = {name: [] for name in request}
+    delay = BACKOFF_BASE_SECONDS
+    while request:
+        resp = client_or_resource.batch_get_item(RequestItems=request)
+        for name, items in resp.get("Responses", {}).items():
+            results.setdefault(name, []).extend(items)
+        request = resp.get("UnprocessedKeys") or None
+        if request:
+            time.sleep(random.uniform(delay / 2, delay))
+            delay = min(delay * 2, BACKOFF_MAX_SECONDS)
+    return results
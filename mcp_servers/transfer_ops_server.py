@@ -4,20 +4,25 @@ Transfer Operations MCP Server
 Provides tools for executing transfers, managing approvals, and logging agent decisions.
 Handles atomic DynamoDB transactions for stock transfers.
 
-Tables used: Transfers (PK: transfer_id, GSI: StatusTimeIndex), AgentDecisions (PK: decision_id, GSI: AgentTimeIndex), Inventory
+Tables used: Transfers (PK: transfer_id, GSI: StatusTimeIndex, SourceWarehouseIndex, TargetWarehouseIndex), AgentDecisions (PK: decision_id, GSI: AgentTimeIndex), Inventory
 """
 
+import asyncio
+import atexit
 import json
 import os
+import signal
 import sys
+import threading
+import time
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 import env_loader
-import urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from mcp_servers.ddb_batch import batch_get_with_backoff
 
 import boto3
-import uuid
-from datetime import datetime
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from typing import Dict, List
 from mcp.server import Server
@@ -26,128 +31,333 @@ from mcp.types import Tool, TextContent
 app = Server("transfer-ops")
 
 REGION = os.environ.get("AWS_DEFAULT_REGION", "us-west-2")
-dynamodb = boto3.resource("dynamodb", region_name=REGION, verify=False)
-dynamodb_client = boto3.client("dynamodb", region_name=REGION, verify=False)
-
-
-def _to_json(obj):
+# Eszamanli tool cagrilari varsayilan 10'luk pool'da beklemesin; keepalive ile
+# pool'daki baglantilar bosta kapanmaz, TLS handshake tekrar edilmez
+_BOTO_CFG = env_loader.get_boto_config(
+    max_pool_connections=64,
+    connect_timeout=1,
+    read_timeout=5,
+    retries={"max_attempts": 3, "mode": "adaptive"},
+)
+dynamodb = boto3.resource("dynamodb", region_name=REGION, verify=env_loader.VERIFY, config=_BOTO_CFG)
+dynamodb_client = boto3.client("dynamodb", region_name=REGION, verify=env_loader.VERIFY, config=_BOTO_CFG)
+
+TRANSFERS_TBL = dynamodb.Table("Transfers")
+DECISIONS_TBL = dynamodb.Table("AgentDecisions")
+INVENTORY_TBL = dynamodb.Table("Inventory")
+
+# Audit kayitlari transferle atomik olmak zorunda degil; BatchWriteItem ile toplu yazilir
+DECISION_BATCH_SIZE = 25
+DECISION_FLUSH_SECONDS = 0.1
+# Basarisiz flush'ta kayitlar atilmaz, buffer'a geri konup bu araliklarla tekrar denenir
+DECISION_RETRY_SECONDS = 1.0
+# DynamoDB uzun sure yazilamazsa bellek sinirsiz buyumesin; dolu buffer'da log_decision hata doner
+DECISION_BUFFER_MAX = 5_000
+_DECISION_SERIALIZER = TypeSerializer()
+_decision_buffer: List[Dict] = []
+_decision_lock = threading.Lock()
+_decision_timer = None
+# AgentDecisions TTL (ttl_expire_at) ile bu kadar gun sonra DynamoDB tarafinda silinir; 0 = sinirsiz
+DECISION_RETENTION_DAYS = int(os.environ.get("DECISION_RETENTION_DAYS", "90"))
+
+# Transaction sonrasi yazilamayan Transfers kayitlari
+_transfer_log_retry: List[Dict] = []
+_transfer_log_lock = threading.Lock()
+
+# Ayni anda DynamoDB'ye giden yazma sayisi sinirlanir; ani patlamalarda throttling +
+# exponential backoff yerine istemci tarafinda sira beklenir. Handler'lar thread'de
+# calistigi icin asyncio degil threading semaforu. Yazanlar asyncio.to_thread'in
+# varsayilan pool'undan (min(32, cpu + 4) thread) geldigi icin varsayilan deger
+# pool'un yarisi; pool boyutunda veya ustunde bir sinir hicbir seyi kisitlamaz.
+_DEFAULT_EXECUTOR_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+MAX_CONCURRENT_WRITES = int(os.environ.get("MAX_CONCURRENT_WRITES", str(max(1, _DEFAULT_EXECUTOR_WORKERS // 2))))
+_write_sem = threading.BoundedSemaphore(MAX_CONCURRENT_WRITES)
+
+
+_ts_prefix = (-1, "")
+
+
+def _now_iso() -> str:
+    """UTC ISO-8601 zaman damgasi (mikrosaniyeli, 'Z' sonekli).
+    Saniye kismi ayni saniye icindeki cagrilar arasinda tekrar formatlanmaz."""
+    global _ts_prefix
+    ns = time.time_ns()
+    sec, us = divmod(ns // 1000, 1_000_000)
+    cached_sec, prefix = _ts_prefix
+    if sec != cached_sec:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec))
+        _ts_prefix = (sec, prefix)
+    return f"{prefix}.{us:06d}Z"
+
+
+_CROCKFORD32 = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_ulid_lock = threading.Lock()
+_ulid_last = (0, 0)
+
+
+def _new_id(prefix: str) -> str:
+    """ULID bicimli (48 bit ms zaman + 80 bit rastgele, Crockford base32) zamana gore
+    siralanan id. Ayni milisaniyede uretilen id'ler rastgele kismi arttirarak monoton kalir;
+    rastgele kisim 2**80 - 1'de tasarsa elde zaman kismina eklenir (ms + 1, rand 0),
+    sira hicbir zaman geriye donmez."""
+    global _ulid_last
+    ms = time.time_ns() // 1_000_000
+    with _ulid_lock:
+        last_ms, last_rand = _ulid_last
+        if ms <= last_ms:
+            ms, rand = divmod(((last_ms << 80) | last_rand) + 1, 1 << 80)
+        else:
+            rand = int.from_bytes(os.urandom(10), "big")
+        _ulid_last = (ms, rand)
+    value = (ms << 80) | rand
+    chars = []
+    for _ in range(26):
+        value, idx = divmod(value, 32)
+        chars.append(_CROCKFORD32[idx])
+    return f"{prefix}-{''.join(reversed(chars))}"
+
+
+def _json_default(obj):
+    # DynamoDB sayilari Decimal doner; tam sayilar int, digerleri float olarak yazilir
     if isinstance(obj, Decimal):
         return int(obj) if obj == int(obj) else float(obj)
-    if isinstance(obj, dict):
-        return {k: _to_json(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [_to_json(i) for i in obj]
-    return obj
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+try:
+    import orjson
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj, default=_json_default).decode()
+except ImportError:  # orjson opsiyonel; yoksa stdlib json
+    def _dumps(obj) -> str:
+        return json.dumps(obj, default=_json_default, separators=(",", ":"), ensure_ascii=False)
+
 
 def _result(data):
-    return [TextContent(type="text", text=json.dumps(_to_json(data), indent=2, ensure_ascii=False))]
+    # Yanitlar agent'a gidiyor; girintisiz (compact) JSON daha kisa ve hizli
+    return [TextContent(type="text", text=_dumps(data))]
+
+
+# Tool tanimlari sabit; her list_tools cagrisinda yeniden kurulmaz
+TOOLS = [
+    Tool(name="execute_transfer", description="Execute an atomic stock transfer between warehouses",
+         inputSchema={"type": "object", "properties": {
+             "source_warehouse_id": {"type": "string"}, "target_warehouse_id": {"type": "string"},
+             "sku": {"type": "string"}, "quantity": {"type": "integer", "minimum": 1},
+             "reason": {"type": "string"}
+         }, "required": ["source_warehouse_id", "target_warehouse_id", "sku", "quantity"]}),
+    Tool(name="get_transfer_history", description="Get transfer history, optionally filtered by warehouse or SKU",
+         inputSchema={"type": "object", "properties": {
+             "warehouse_id": {"type": "string"}, "sku": {"type": "string"},
+             "status": {"type": "string"}, "limit": {"type": "integer", "default": 50}
+         }}),
+    Tool(name="get_transfer_status", description="Get status of a specific transfer",
+         inputSchema={"type": "object", "properties": {
+             "transfer_id": {"type": "string"},
+             "fields": {"type": "array", "items": {"type": "string"}}
+         }, "required": ["transfer_id"]}),
+    Tool(name="log_decision", description="Log an agent decision for audit trail",
+         inputSchema={"type": "object", "properties": {
+             "agent_name": {"type": "string"}, "decision_type": {"type": "string"},
+             "input_data": {"type": "object"}, "output_data": {"type": "object"},
+             "reasoning": {"type": "string"}
+         }, "required": ["agent_name", "decision_type"]}),
+    Tool(name="get_agent_decisions", description="Get decision history for an agent",
+         inputSchema={"type": "object", "properties": {
+             "agent_name": {"type": "string"}, "limit": {"type": "integer", "default": 50},
+             "full": {"type": "boolean", "default": False}
+         }, "required": ["agent_name"]}),
+    Tool(name="get_decision", description="Get a single agent decision with full input/output data",
+         inputSchema={"type": "object", "properties": {"decision_id": {"type": "string"}}, "required": ["decision_id"]}),
+    Tool(name="rollback_transfer", description="Rollback a completed transfer (emergency use)",
+         inputSchema={"type": "object", "properties": {
+             "transfer_id": {"type": "string"}, "reason": {"type": "string"}
+         }, "required": ["transfer_id", "reason"]}),
+    Tool(name="list_transfers_by_status", description="List transfers by status using StatusTimeIndex GSI",
+         inputSchema={"type": "object", "properties": {
+             "status": {"type": "string"}, "limit": {"type": "integer", "default": 50}
+         }, "required": ["status"]}),
+]
 
 
 @app.list_tools()
 async def list_tools() -> List[Tool]:
-    return [
-        Tool(name="execute_transfer", description="Execute an atomic stock transfer between warehouses",
-             inputSchema={"type": "object", "properties": {
-                 "source_warehouse_id": {"type": "string"}, "target_warehouse_id": {"type": "string"},
-                 "sku": {"type": "string"}, "quantity": {"type": "integer", "minimum": 1},
-                 "reason": {"type": "string"}
-             }, "required": ["source_warehouse_id", "target_warehouse_id", "sku", "quantity"]}),
-        Tool(name="get_transfer_history", description="Get transfer history, optionally filtered by warehouse or SKU",
-             inputSchema={"type": "object", "properties": {
-                 "warehouse_id": {"type": "string"}, "sku": {"type": "string"},
-                 "status": {"type": "string"}, "limit": {"type": "integer", "default": 50}
-             }}),
-        Tool(name="get_transfer_status", description="Get status of a specific transfer",
-             inputSchema={"type": "object", "properties": {"transfer_id": {"type": "string"}}, "required": ["transfer_id"]}),
-        Tool(name="log_decision", description="Log an agent decision for audit trail",
-             inputSchema={"type": "object", "properties": {
-                 "agent_name": {"type": "string"}, "decision_type": {"type": "string"},
-                 "input_data": {"type": "object"}, "output_data": {"type": "object"},
-                 "reasoning": {"type": "string"}
-             }, "required": ["agent_name", "decision_type"]}),
-        Tool(name="get_agent_decisions", description="Get decision history for an agent",
-             inputSchema={"type": "object", "properties": {
-                 "agent_name": {"type": "string"}, "limit": {"type": "integer", "default": 50}
-             }, "required": ["agent_name"]}),
-        Tool(name="rollback_transfer", description="Rollback a completed transfer (emergency use)",
-             inputSchema={"type": "object", "properties": {
-                 "transfer_id": {"type": "string"}, "reason": {"type": "string"}
-             }, "required": ["transfer_id", "reason"]}),
-        Tool(name="list_transfers_by_status", description="List transfers by status using StatusTimeIndex GSI",
-             inputSchema={"type": "object", "properties": {
-                 "status": {"type": "string"}, "limit": {"type": "integer", "default": 50}
-             }, "required": ["status"]}),
-    ]
+    return TOOLS
+
+
+# Tool adi -> handler; her call_tool cagrisinda yeniden kurulmaz
+TOOL_DISPATCH = {
+    "execute_transfer": lambda a: execute_transfer(a["source_warehouse_id"], a["target_warehouse_id"], a["sku"], a["quantity"], a.get("reason", "")),
+    "get_transfer_history": lambda a: get_transfer_history(a.get("warehouse_id"), a.get("sku"), a.get("status"), a.get("limit", 50)),
+    "get_transfer_status": lambda a: get_transfer_status(a["transfer_id"], a.get("fields")),
+    "log_decision": lambda a: log_decision(a["agent_name"], a["decision_type"], a.get("input_data", {}), a.get("output_data", {}), a.get("reasoning", "")),
+    "get_agent_decisions": lambda a: get_agent_decisions(a["agent_name"], a.get("limit", 50), a.get("full", False)),
+    "get_decision": lambda a: get_decision(a["decision_id"]),
+    "rollback_transfer": lambda a: rollback_transfer(a["transfer_id"], a["reason"]),
+    "list_transfers_by_status": lambda a: list_transfers_by_status(a["status"], a.get("limit", 50)),
+}
 
 
 @app.call_tool()
 async def call_tool(name: str, arguments: dict) -> List[TextContent]:
-    handlers = {
-        "execute_transfer": lambda a: execute_transfer(a["source_warehouse_id"], a["target_warehouse_id"], a["sku"], a["quantity"], a.get("reason", "")),
-        "get_transfer_history": lambda a: get_transfer_history(a.get("warehouse_id"), a.get("sku"), a.get("status"), a.get("limit", 50)),
-        "get_transfer_status": lambda a: get_transfer_status(a["transfer_id"]),
-        "log_decision": lambda a: log_decision(a["agent_name"], a["decision_type"], a.get("input_data", {}), a.get("output_data", {}), a.get("reasoning", "")),
-        "get_agent_decisions": lambda a: get_agent_decisions(a["agent_name"], a.get("limit", 50)),
-        "rollback_transfer": lambda a: rollback_transfer(a["transfer_id"], a["reason"]),
-        "list_transfers_by_status": lambda a: list_transfers_by_status(a["status"], a.get("limit", 50)),
-    }
-    handler = handlers.get(name)
+    handler = TOOL_DISPATCH.get(name)
     if not handler:
         raise ValueError(f"Unknown tool: {name}")
-    return _result(handler(arguments))
+    # boto3 senkron; DynamoDB RTT'si boyunca event loop'u bloklamasin
+    return _result(await asyncio.to_thread(handler, arguments))
 
 
 # --- Implementation ---
 
-def execute_transfer(source_wh: str, target_wh: str, sku: str, quantity: int, reason: str = "") -> Dict:
-    """Atomic stock transfer using DynamoDB transact_write_items."""
-    transfer_id = f"TRF-{uuid.uuid4().hex[:8].upper()}"
-    ts = datetime.utcnow().isoformat() + "Z"
+BATCH_GET_LIMIT = 100  # BatchGetItem'in istek basina anahtar siniri
+DECISION_SUMMARY_FIELDS = ("decision_id", "decision_type", "timestamp", "reasoning")
+ROLLBACK_FIELDS = ("status", "source_warehouse", "target_warehouse", "sku", "quantity", "version")
+
 
+def _projection(fields) -> Dict:
+    """Alan listesini ProjectionExpression kwargs'ina cevirir.
+    status/timestamp gibi reserved kelimeler icin hepsi #n ile adlandirilir."""
+    names = {f"#p{i}": f for i, f in enumerate(fields)}
+    return {"ProjectionExpression": ", ".join(names), "ExpressionAttributeNames": names}
+
+
+def _put_transfer_log(item: Dict) -> bool:
     try:
-        dynamodb_client.transact_write_items(TransactItems=[
-            {"Update": {
-                "TableName": "Inventory",
-                "Key": {"warehouse_id": {"S": source_wh}, "sku": {"S": sku}},
-                "UpdateExpression": "SET quantity = quantity - :qty, last_updated = :ts",
-                "ConditionExpression": "quantity >= :qty",
-                "ExpressionAttributeValues": {":qty": {"N": str(quantity)}, ":ts": {"S": ts}}
-            }},
-            {"Update": {
-                "TableName": "Inventory",
-                "Key": {"warehouse_id": {"S": target_wh}, "sku": {"S": sku}},
-                "UpdateExpression": "SET quantity = quantity + :qty, last_updated = :ts",
-                "ExpressionAttributeValues": {":qty": {"N": str(quantity)}, ":ts": {"S": ts}}
-            }},
-            {"Put": {
-                "TableName": "Transfers",
-                "Item": {
-                    "transfer_id": {"S": transfer_id},
-                    "source_warehouse": {"S": source_wh},
-                    "target_warehouse": {"S": target_wh},
-                    "sku": {"S": sku},
-                    "quantity": {"N": str(quantity)},
-                    "status": {"S": "completed"},
-                    "reason": {"S": reason},
-                    "created_at": {"S": ts},
-                    "completed_at": {"S": ts},
-                    "initiated_by": {"S": "mcp_transfer_ops"}
-                }
-            }}
-        ])
-        return {"success": True, "transfer_id": transfer_id, "status": "completed", "timestamp": ts,
-                "details": {"source": source_wh, "target": target_wh, "sku": sku, "quantity": quantity, "reason": reason}}
+        TRANSFERS_TBL.put_item(Item=item)
+        return True
+    except Exception as e:
+        print(f"[transfer-ops] transfer kaydi yazilamadi {item['transfer_id']}: {e}", file=sys.stderr)
+        with _transfer_log_lock:
+            _transfer_log_retry.append(item)
+        return False
+
+
+def _retry_transfer_logs() -> None:
+    """Onceden yazilamamis Transfers kayitlarini tekrar dener."""
+    with _transfer_log_lock:
+        items = _transfer_log_retry[:]
+        _transfer_log_retry.clear()
+    for item in items:
+        _put_transfer_log(item)
+
+
+atexit.register(_retry_transfer_logs)
+
+
+def _transfer_txn_items(source_wh: str, target_wh: str, sku: str, quantity: int, ts: str) -> List[Dict]:
+    """Kaynaktan dusen, hedefe ekleyen iki Inventory Update'i (TransactItems)."""
+    # Iki Update ayni sku ve ayni :qty/:ts degerlerini kullanir; tek sefer kurulur
+    sku_av = {"S": sku}
+    eav = {":qty": {"N": str(quantity)}, ":ts": {"S": ts}}
+    return [
+        {"Update": {
+            "TableName": "Inventory",
+            "Key": {"warehouse_id": {"S": source_wh}, "sku": sku_av},
+            "UpdateExpression": "SET quantity = quantity - :qty, last_updated = :ts",
+            "ConditionExpression": "quantity >= :qty",
+            "ExpressionAttributeValues": eav
+        }},
+        {"Update": {
+            "TableName": "Inventory",
+            "Key": {"warehouse_id": {"S": target_wh}, "sku": sku_av},
+            "UpdateExpression": "SET quantity = quantity + :qty, last_updated = :ts",
+            "ExpressionAttributeValues": eav
+        }},
+    ]
+
+
+def _log_completed_transfer(transfer_id: str, source_wh: str, target_wh: str, sku: str,
+                            quantity: int, reason: str, ts: str) -> Dict:
+    """Commit edilmis transferin Transfers kaydini yazar ve tool yanitini dondurur."""
+    _retry_transfer_logs()
+    logged = _put_transfer_log({
+        "transfer_id": transfer_id,
+        "source_warehouse": source_wh,
+        "target_warehouse": target_wh,
+        "sku": sku,
+        "quantity": quantity,
+        "status": "completed",
+        "reason": reason,
+        "created_at": ts,
+        "completed_at": ts,
+        "initiated_by": "mcp_transfer_ops",
+        "version": 0
+    })
+    return {"success": True, "transfer_id": transfer_id, "status": "completed", "timestamp": ts,
+            "logged": logged,
+            "details": {"source": source_wh, "target": target_wh, "sku": sku, "quantity": quantity, "reason": reason}}
+
+
+def execute_transfer(source_wh: str, target_wh: str, sku: str, quantity: int, reason: str = "") -> Dict:
+    """Atomic stock transfer using DynamoDB transact_write_items.
+
+    Transaction sadece iki Inventory update'ini icerir; Transfers kaydi commit
+    sonrasi ayri PutItem ile yazilir. Stok hareketi esas kaynaktir, log yazilamazsa
+    envanter geri alinmaz, kayit retry kuyruguna alinir."""
+    # Gecersiz istekler DynamoDB round-trip'ine gitmeden reddedilir
+    if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+        return {"success": False, "error": "quantity must be a positive integer"}
+    if not source_wh or not target_wh:
+        return {"success": False, "error": "source and target warehouse are required"}
+    if source_wh == target_wh:
+        return {"success": False, "error": "source and target must differ"}
+    if not sku:
+        return {"success": False, "error": "sku is required"}
+
+    transfer_id = _new_id("TRF")
+    ts = _now_iso()
+    try:
+        with _write_sem:
+            dynamodb_client.transact_write_items(
+                TransactItems=_transfer_txn_items(source_wh, target_wh, sku, quantity, ts))
     except dynamodb_client.exceptions.TransactionCanceledException as e:
         return {"success": False, "error": "Transaction failed - insufficient stock or condition not met", "details": str(e)}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+    return _log_completed_transfer(transfer_id, source_wh, target_wh, sku, quantity, reason, ts)
+
+
+def _query_warehouse_index(index_name: str, key_attr: str, warehouse_id: str,
+                           sku: str = None, limit: int = 50) -> List[Dict]:
+    from boto3.dynamodb.conditions import Key, Attr
+    kwargs = {
+        "IndexName": index_name,
+        "KeyConditionExpression": Key(key_attr).eq(warehouse_id),
+        "ScanIndexForward": False,
+    }
+    if sku:
+        kwargs["FilterExpression"] = Attr("sku").eq(sku)
+    items: List[Dict] = []
+    # Filter Limit'ten sonra uygulandigi icin limit dolana kadar sayfala
+    while True:
+        kwargs["Limit"] = limit - len(items)
+        resp = TRANSFERS_TBL.query(**kwargs)
+        items.extend(resp.get("Items", []))
+        if len(items) >= limit or "LastEvaluatedKey" not in resp:
+            return items
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def _warehouse_history(warehouse_id: str, sku: str = None, limit: int = 50) -> List[Dict]:
+    """Kaynak ve hedef GSI'larini paralel sorgulayip created_at'e gore birlestirir."""
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        src = executor.submit(_query_warehouse_index, "SourceWarehouseIndex", "source_warehouse",
+                              warehouse_id, sku, limit)
+        tgt = executor.submit(_query_warehouse_index, "TargetWarehouseIndex", "target_warehouse",
+                              warehouse_id, sku, limit)
+        items = src.result() + tgt.result()
+    items.sort(key=lambda i: i.get("created_at", ""), reverse=True)
+    return items[:limit]
+
 
 def get_transfer_history(warehouse_id: str = None, sku: str = None, status: str = None, limit: int = 50) -> Dict:
-    """Transfer gecmisi. GSI yok (WarehouseIndex/SKUIndex), scan+filter kullaniyoruz.
-    Sadece StatusTimeIndex GSI mevcut."""
+    """Transfer gecmisi. Status icin StatusTimeIndex, depo icin Source/TargetWarehouseIndex
+    GSI'lari kullanilir. Index'leri olmayan eski tablolarda scan+filter'a duser."""
+    if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+        return {"success": False, "error": "limit must be a positive integer", "data": []}
     try:
-        table = dynamodb.Table("Transfers")
 
         if status:
             # StatusTimeIndex GSI kullan
@@ -169,34 +379,46 @@ def get_transfer_history(warehouse_id: str = None, sku: str = None, status: str
             if fe_parts:
                 kwargs["FilterExpression"] = " AND ".join(fe_parts)
                 kwargs["ExpressionAttributeValues"] = {**kwargs.get("ExpressionAttributeValues", {}), **eav}
-            resp = table.query(**kwargs)
+            items = TRANSFERS_TBL.query(**kwargs).get("Items", [])
         else:
-            # Scan with filters
-            from boto3.dynamodb.conditions import Attr
-            filters = []
+            items = None
             if warehouse_id:
-                filters.append(Attr("source_warehouse").eq(warehouse_id) | Attr("target_warehouse").eq(warehouse_id))
-            if sku:
-                filters.append(Attr("sku").eq(sku))
-
-            kwargs = {"Limit": limit}
-            if filters:
-                combined = filters[0]
-                for f in filters[1:]:
-                    combined = combined & f
-                kwargs["FilterExpression"] = combined
-
-            resp = table.scan(**kwargs)
-
-        return {"success": True, "count": len(resp.get("Items", [])), "data": resp.get("Items", [])}
+                try:
+                    items = _warehouse_history(warehouse_id, sku, limit)
+                except ClientError as e:
+                    # Tablo yeni GSI'lar olmadan kurulmus; scan'e dus. Diger
+                    # ValidationException'lar (gecersiz parametre) hata olarak doner.
+                    err = e.response["Error"]
+                    if err["Code"] != "ValidationException" or "specified index" not in err.get("Message", ""):
+                        raise
+
+            if items is None:
+                # Scan with filters
+                from boto3.dynamodb.conditions import Attr
+                filters = []
+                if warehouse_id:
+                    filters.append(Attr("source_warehouse").eq(warehouse_id) | Attr("target_warehouse").eq(warehouse_id))
+                if sku:
+                    filters.append(Attr("sku").eq(sku))
+
+                kwargs = {"Limit": limit}
+                if filters:
+                    combined = filters[0]
+                    for f in filters[1:]:
+                        combined = combined & f
+                    kwargs["FilterExpression"] = combined
+
+                items = TRANSFERS_TBL.scan(**kwargs).get("Items", [])
+
+        return {"success": True, "count": len(items), "data": items}
     except Exception as e:
         return {"success": False, "error": str(e), "data": []}
 
 
-def get_transfer_status(transfer_id: str) -> Dict:
+def get_transfer_status(transfer_id: str, fields: List[str] = None) -> Dict:
     try:
-        table = dynamodb.Table("Transfers")
-        resp = table.get_item(Key={"transfer_id": transfer_id})
+        kwargs = _projection(fields) if fields else {}
+        resp = TRANSFERS_TBL.get_item(Key={"transfer_id": transfer_id}, **kwargs)
         if "Item" in resp:
             return {"success": True, "data": resp["Item"]}
         return {"success": False, "error": "Transfer not found"}
@@ -204,43 +426,132 @@ def get_transfer_status(transfer_id: str) -> Dict:
         return {"success": False, "error": str(e)}
 
 
-def log_decision(agent_name: str, decision_type: str, input_data: Dict = None,
-                 output_data: Dict = None, reasoning: str = "") -> Dict:
-    decision_id = f"DEC-{uuid.uuid4().hex[:8].upper()}"
-    ts = datetime.utcnow().isoformat() + "Z"
+def _schedule_decision_flush(delay: float) -> None:
+    """_decision_lock tutulurken cagrilir; bekleyen timer yoksa kurar."""
+    global _decision_timer
+    if _decision_timer is None:
+        _decision_timer = threading.Timer(delay, _flush_decisions)
+        _decision_timer.daemon = True
+        _decision_timer.start()
+
+
+def _flush_decisions() -> bool:
+    """Buffer'daki kararlari batch_writer ile yazar (25'lik parcalar, UnprocessedItems retry).
+    Yazma hata verirse kayitlar buffer'in basina geri konur ve flush tekrar planlanir;
+    ayni decision_id ile tekrar yazim idempotent oldugu icin kismi yazim sorun olmaz."""
+    global _decision_timer
+    with _decision_lock:
+        items = _decision_buffer[:]
+        _decision_buffer.clear()
+        if _decision_timer is not None:
+            _decision_timer.cancel()
+            _decision_timer = None
+    if not items:
+        return True
     try:
-        table = dynamodb.Table("AgentDecisions")
-        table.put_item(Item={
-            "decision_id": decision_id, "agent_name": agent_name,
-            "decision_type": decision_type, "input_data": input_data or {},
-            "output_data": output_data or {}, "reasoning": reasoning, "timestamp": ts
-        })
-        return {"success": True, "decision_id": decision_id, "timestamp": ts}
+        with _write_sem, DECISIONS_TBL.batch_writer() as writer:
+            for item in items:
+                writer.put_item(Item=item)
+        return True
     except Exception as e:
-        return {"success": False, "error": str(e)}
+        print(f"[transfer-ops] {len(items)} decision yazilamadi, {DECISION_RETRY_SECONDS}s sonra tekrar denenecek: {e}",
+              file=sys.stderr)
+        with _decision_lock:
+            _decision_buffer[:0] = items
+            _schedule_decision_flush(DECISION_RETRY_SECONDS)
+        return False
 
 
-def get_agent_decisions(agent_name: str, limit: int = 50) -> Dict:
-    """AgentTimeIndex GSI kullanarak agent kararlarini getirir."""
+atexit.register(_flush_decisions)
+
+
+def _to_dynamo(value):
+    """MCP JSON'undaki float'lari Decimal'e cevirir (boto3 float kabul etmiyor);
+    NaN/Infinity ve JSON disi tipler burada ValueError/TypeError verir."""
+    return json.loads(json.dumps(value, allow_nan=False), parse_float=Decimal)
+
+
+def log_decision(agent_name: str, decision_type: str, input_data: Dict = None,
+                 output_data: Dict = None, reasoning: str = "") -> Dict:
+    """Karari buffer'a ekler; 25 kayit dolunca ya da 100ms sonra toplu yazilir.
+    Yazilamayacak kayitlar (serialize edilemeyen veri, dolu buffer) burada reddedilir."""
+    decision_id = _new_id("DEC")
+    ts = _now_iso()
+    try:
+        item = {
+            "decision_id": decision_id, "agent_name": agent_name,
+            "decision_type": decision_type, "input_data": _to_dynamo(input_data or {}),
+            "output_data": _to_dynamo(output_data or {}), "reasoning": reasoning, "timestamp": ts
+        }
+        if DECISION_RETENTION_DAYS > 0:
+            item["ttl_expire_at"] = int(time.time()) + DECISION_RETENTION_DAYS * 86400
+        # Flush sirasinda patlayip tum batch'i bekletmesin diye tipler simdi dogrulanir
+        _DECISION_SERIALIZER.serialize(item)
+    except (TypeError, ValueError, ArithmeticError) as e:
+        return {"success": False, "error": f"Decision is not serializable: {e}"}
+
+    with _decision_lock:
+        if len(_decision_buffer) >= DECISION_BUFFER_MAX:
+            return {"success": False, "error": "Decision buffer full; DynamoDB writes are failing"}
+        _decision_buffer.append(item)
+        full = len(_decision_buffer) >= DECISION_BATCH_SIZE
+        if not full:
+            _schedule_decision_flush(DECISION_FLUSH_SECONDS)
+    if full:
+        _flush_decisions()
+    return {"success": True, "decision_id": decision_id, "timestamp": ts}
+
+
+def _get_decisions_by_id(decision_ids: List[str]) -> List[Dict]:
+    """Ana tablodan tam kararlari BatchGetItem ile okur, verilen sirayi korur.
+
+    UnprocessedKeys ortak batch_get_with_backoff ile tekrar denenir.
+    """
+    found = {}
+    for i in range(0, len(decision_ids), BATCH_GET_LIMIT):
+        request = {"AgentDecisions": {"Keys": [{"decision_id": d} for d in decision_ids[i:i + BATCH_GET_LIMIT]]}}
+        for item in batch_get_with_backoff(dynamodb, request)["AgentDecisions"]:
+            found[item["decision_id"]] = item
+    return [found[d] for d in decision_ids if d in found]
+
+
+def get_agent_decisions(agent_name: str, limit: int = 50, full: bool = False) -> Dict:
+    """AgentTimeIndex GSI kullanarak agent kararlarini getirir.
+    GSI sadece ozet alanlari tasir; full=True iken tam kayitlar ana tablodan okunur."""
+    # Buffer'da bekleyen kararlar da sorguda gorunsun
+    _flush_decisions()
     try:
         from boto3.dynamodb.conditions import Key
-        table = dynamodb.Table("AgentDecisions")
-        resp = table.query(
+        resp = DECISIONS_TBL.query(
             IndexName="AgentTimeIndex",
             KeyConditionExpression=Key("agent_name").eq(agent_name),
-            Limit=limit, ScanIndexForward=False
+            Limit=limit, ScanIndexForward=False,
+            **_projection(("decision_id",) if full else DECISION_SUMMARY_FIELDS)
         )
-        return {"success": True, "count": len(resp.get("Items", [])), "data": resp.get("Items", [])}
+        items = resp.get("Items", [])
+        if full and items:
+            items = _get_decisions_by_id([i["decision_id"] for i in items])
+        return {"success": True, "count": len(items), "data": items}
     except Exception as e:
         return {"success": False, "error": str(e), "data": []}
 
 
+def get_decision(decision_id: str) -> Dict:
+    _flush_decisions()
+    try:
+        resp = DECISIONS_TBL.get_item(Key={"decision_id": decision_id})
+        if "Item" in resp:
+            return {"success": True, "data": resp["Item"]}
+        return {"success": False, "error": "Decision not found"}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
 def list_transfers_by_status(status: str, limit: int = 50) -> Dict:
     """StatusTimeIndex GSI ile status bazli transfer listesi."""
     try:
         from boto3.dynamodb.conditions import Key
-        table = dynamodb.Table("Transfers")
-        resp = table.query(
+        resp = TRANSFERS_TBL.query(
             IndexName="StatusTimeIndex",
             KeyConditionExpression=Key("status").eq(status),
             Limit=limit, ScanIndexForward=False
@@ -251,9 +562,15 @@ def list_transfers_by_status(status: str, limit: int = 50) -> Dict:
 
 
 def rollback_transfer(transfer_id: str, reason: str) -> Dict:
+    """Tamamlanmis transferi tersine cevirir.
+
+    Ters stok hareketi ile orijinal kaydin 'rolled_back' isaretlenmesi tek
+    TransactWriteItems'ta yapilir. Isaretleme status + version kosulludur; ayni
+    transferi eszamanli geri alan ikinci cagri stok hareketi yapmadan conflict ile
+    duser. version alani olmayan eski kayitlar 0 kabul edilir."""
     try:
-        table = dynamodb.Table("Transfers")
-        resp = table.get_item(Key={"transfer_id": transfer_id})
+        resp = TRANSFERS_TBL.get_item(Key={"transfer_id": transfer_id}, ConsistentRead=True,
+                                      **_projection(ROLLBACK_FIELDS))
         if "Item" not in resp:
             return {"success": False, "error": "Transfer not found"}
 
@@ -261,34 +578,75 @@ def rollback_transfer(transfer_id: str, reason: str) -> Dict:
         if transfer.get("status") != "completed":
             return {"success": False, "error": f"Cannot rollback status: {transfer.get('status')}"}
 
-        # Reverse transfer
-        rb = execute_transfer(
-            source_wh=str(transfer["target_warehouse"]),
-            target_wh=str(transfer["source_warehouse"]),
-            sku=str(transfer["sku"]),
-            quantity=int(transfer["quantity"]),
-            reason=f"ROLLBACK: {reason}"
-        )
-
-        # Mark original as rolled back
-        ts = datetime.utcnow().isoformat() + "Z"
-        table.update_item(
-            Key={"transfer_id": transfer_id},
-            UpdateExpression="SET #s = :s, rollback_reason = :r, rollback_at = :t",
-            ExpressionAttributeNames={"#s": "status"},
-            ExpressionAttributeValues={":s": "rolled_back", ":r": reason, ":t": ts}
-        )
+        source_wh = str(transfer["target_warehouse"])
+        target_wh = str(transfer["source_warehouse"])
+        sku = str(transfer["sku"])
+        quantity = int(transfer["quantity"])
+
+        # Ters transferin kaynagi (orijinal hedef) yeterli stoga sahip degilse
+        # transaction'a girmeden mevcut/gereken miktarla net hata don
+        inv = INVENTORY_TBL.get_item(
+            Key={"warehouse_id": source_wh, "sku": sku},
+            ConsistentRead=True, ProjectionExpression="quantity"
+        ).get("Item")
+        available = int(inv.get("quantity", 0)) if inv else 0
+        if available < quantity:
+            return {"success": False, "error": "Insufficient stock at target warehouse for rollback",
+                    "details": {"warehouse": source_wh, "available": available, "required": quantity}}
+
+        version = int(transfer.get("version", 0))
+        ts = _now_iso()
+        rb_reason = f"ROLLBACK: {reason}"
+        txn_items = _transfer_txn_items(source_wh, target_wh, sku, quantity, ts)
+        # Mark original as rolled back (sadece okudugumuz versiyon hala gecerliyse)
+        txn_items.append({"Update": {
+            "TableName": "Transfers",
+            "Key": {"transfer_id": {"S": transfer_id}},
+            "UpdateExpression": "SET #s = :s, rollback_reason = :r, rollback_at = :t, #v = :v1",
+            "ConditionExpression": "#s = :completed AND (#v = :v OR attribute_not_exists(#v))",
+            "ExpressionAttributeNames": {"#s": "status", "#v": "version"},
+            "ExpressionAttributeValues": {
+                ":s": {"S": "rolled_back"}, ":r": {"S": reason}, ":t": {"S": ts},
+                ":completed": {"S": "completed"},
+                ":v": {"N": str(version)}, ":v1": {"N": str(version + 1)},
+            }
+        }})
+        rb_id = _new_id("TRF")
+        try:
+            with _write_sem:
+                dynamodb_client.transact_write_items(TransactItems=txn_items)
+        except dynamodb_client.exceptions.TransactionCanceledException as e:
+            reasons = e.response.get("CancellationReasons", [])
+            if len(reasons) > 2 and reasons[2].get("Code") == "ConditionalCheckFailed":
+                # Tekrar denenmez; ikinci bir ters transfer calistirilmamali
+                return {"success": False, "error": "conflict", "transfer_id": transfer_id,
+                        "details": "Transfer was modified concurrently; rollback skipped"}
+            return {"success": False, "error": "Rollback transfer failed - insufficient stock or condition not met",
+                    "details": str(e)}
+
+        rb = _log_completed_transfer(rb_id, source_wh, target_wh, sku, quantity, rb_reason, ts)
         return {"success": True, "transfer_id": transfer_id, "status": "rolled_back", "rollback_transfer": rb}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
+def _shutdown_flush() -> None:
+    """Buffer'da bekleyen karar ve transfer kayitlarini kapanmadan once yazar."""
+    _flush_decisions()
+    _retry_transfer_logs()
+
+
 if __name__ == "__main__":
-    import asyncio
     from mcp.server.stdio import stdio_server
 
+    # atexit SIGTERM'de calismaz; SIGTERM'i SystemExit'e cevirip finally'deki flush'a dusur
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
     async def run():
         async with stdio_server() as (read, write):
             await app.run(read, write, app.create_initialization_options())
 
-    asyncio.run(run())
+    try:
+        asyncio.run(run())
+    finally:
+        _shutdown_flush()
@@ -0,0 +1,58 @@
+"""MCP server'larinin process ici TTL cache yardimcilari.
+
+Cache'ler duz dict'tir: key -> (son_gecerlilik, deger). Bulunamayan kayitlar (None)
+kisa sure tutulur; hemen ardindan olusturulan depo/urun dakikalarca gorunmez kalmasin.
+"""
+import threading
+import time
+from itertools import islice
+
+MAX_ENTRIES = 10_000
+MISS_TTL_SECONDS = 5
+# Dolu cache'te suresi dolanlar yetmezse en eski yazilan girdilerin bu orani atilir;
+# her put'ta tekrar tahliye yapilmaz, sicak girdiler toptan dusmez
+EVICT_FRACTION = 0.1
+
+_lock = threading.Lock()
+
+
+def _evict(cache: dict):
+    now = time.monotonic()
+    for key in [k for k, (expires, _) in cache.items() if expires <= now]:
+        del cache[key]
+    target = MAX_ENTRIES - max(1, int(MAX_ENTRIES * EVICT_FRACTION))
+    excess = len(cache) - target
+    if excess > 0:
+        # dict ekleme sirasini korur; put yeniden yazilan anahtari sona tasir
+        for key in list(islice(cache, excess)):
+            del cache[key]
+
+
+def put(cache: dict, key, value, ttl: float):
+    """Degeri ttl saniyeligine yazar; None icin ttl MISS_TTL_SECONDS ile sinirlanir."""
+    if value is None:
+        ttl = min(ttl, MISS_TTL_SECONDS)
+    with _lock:
+        if key in cache:
+            del cache[key]
+        elif len(cache) >= MAX_ENTRIES:
+            _evict(cache)
+        cache[key] = (time.monotonic() + ttl, value)
+
+
+def lookup(cache: dict, key):
+    """(True, deger) veya suresi dolmus/yoksa (False, None)."""
+    hit = cache.get(key)
+    if hit and hit[0] > time.monotonic():
+        return True, hit[1]
+    return False, None
+
+
+def get_or_load(cache: dict, key, loader, ttl: float):
+    """Cache'te gecerli deger yoksa loader() sonucunu yazip dondurur."""
+    found, value = lookup(cache, key)
+    if found:
+        return value
+    value = loader()
+    put(cache, key, value, ttl)
+    return value
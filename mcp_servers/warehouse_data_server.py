@@ -4,13 +4,14 @@ Warehouse Data MCP Server
 Provides tools for accessing warehouse, inventory, and product data from DynamoDB.
 """
 
+import asyncio
 import json
 import os
 import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 import env_loader
-import urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from mcp_servers import ttl_cache
+from mcp_servers.ddb_batch import batch_get_with_backoff
 
 import boto3
 from decimal import Decimal
@@ -21,7 +22,35 @@ from mcp.types import Tool, TextContent
 app = Server("warehouse-data")
 
 REGION = os.environ.get("AWS_DEFAULT_REGION", "us-west-2")
-dynamodb = boto3.resource("dynamodb", region_name=REGION, verify=False)
+# Eszamanli tool cagrilari varsayilan 10'luk pool'da beklemesin; keepalive ile
+# uzun omurlu MCP oturumunda pool'daki baglantilar sicak kalir
+_BOTO_CFG = env_loader.get_boto_config(max_pool_connections=64)
+dynamodb = boto3.resource("dynamodb", region_name=REGION, verify=env_loader.VERIFY, config=_BOTO_CFG)
+
+# Table handle'lari her tool cagrisinda yeniden kurulmasin
+INVENTORY_TBL = dynamodb.Table("Inventory")
+WAREHOUSES_TBL = dynamodb.Table("Warehouses")
+PRODUCTS_TBL = dynamodb.Table("Products")
+
+# Depo ve urun kayitlari nadiren degisir; tekrar eden okumalar process icinden donsun
+WAREHOUSE_CACHE_TTL_SECONDS = 60
+PRODUCT_CACHE_TTL_SECONDS = 300
+_warehouse_cache: Dict[str, tuple] = {}
+_product_cache: Dict[str, tuple] = {}
+
+# Process'ler arasi paylasilan ikinci katman: REDIS_URL verilirse depo/urun
+# kayitlari Redis'te de tutulur (yeni baslayan MCP process'leri soguk baslamaz).
+# Bulunamayan kayitlar Redis'e yazilmaz; kisa sureli miss cache sadece process icinde.
+REDIS_URL = os.environ.get("REDIS_URL")
+REDIS_TTL_SECONDS = 300
+try:
+    import redis
+except ImportError:  # redis opsiyonel; yoksa sadece process ici cache
+    redis = None
+_redis = (
+    redis.Redis.from_url(REDIS_URL, socket_timeout=0.2, socket_connect_timeout=0.2, max_connections=50)
+    if redis is not None and REDIS_URL else None
+)
 
 
 def _to_json(obj):
@@ -58,33 +87,73 @@ async def list_tools() -> List[Tool]:
              inputSchema={"type": "object", "properties": {"warehouse_id": {"type": "string"}}, "required": ["warehouse_id"]}),
         Tool(name="list_warehouses_by_region", description="List warehouses in a region",
              inputSchema={"type": "object", "properties": {"region": {"type": "string"}}, "required": ["region"]}),
+        Tool(name="validate_transfer", description="Check that a transfer is possible (source stock, target warehouse) before executing it",
+             inputSchema={"type": "object", "properties": {
+                 "source_warehouse_id": {"type": "string"}, "target_warehouse_id": {"type": "string"},
+                 "sku": {"type": "string"}, "quantity": {"type": "integer", "minimum": 1}
+             }, "required": ["source_warehouse_id", "target_warehouse_id", "sku", "quantity"]}),
     ]
 
 
+# Tool adi -> handler; her call_tool cagrisinda yeniden kurulmaz
+TOOL_DISPATCH = {
+    "get_inventory": lambda a: get_inventory(a["warehouse_id"], a["sku"]),
+    "get_warehouse_info": lambda a: get_warehouse_info(a["warehouse_id"]),
+    "list_warehouses": lambda a: list_warehouses(),
+    "list_low_stock_items": lambda a: list_low_stock_items(a["warehouse_id"]),
+    "get_product_info": lambda a: get_product_info(a["sku"]),
+    "list_products_by_category": lambda a: list_products_by_category(a["category"]),
+    "get_warehouse_inventory": lambda a: get_warehouse_inventory(a["warehouse_id"]),
+    "list_warehouses_by_region": lambda a: list_warehouses_by_region(a["region"]),
+    "validate_transfer": lambda a: validate_transfer(a["source_warehouse_id"], a["target_warehouse_id"], a["sku"], a["quantity"]),
+}
+
+
 @app.call_tool()
 async def call_tool(name: str, arguments: dict) -> List[TextContent]:
-    handlers = {
-        "get_inventory": lambda a: get_inventory(a["warehouse_id"], a["sku"]),
-        "get_warehouse_info": lambda a: get_warehouse_info(a["warehouse_id"]),
-        "list_warehouses": lambda a: list_warehouses(),
-        "list_low_stock_items": lambda a: list_low_stock_items(a["warehouse_id"]),
-        "get_product_info": lambda a: get_product_info(a["sku"]),
-        "list_products_by_category": lambda a: list_products_by_category(a["category"]),
-        "get_warehouse_inventory": lambda a: get_warehouse_inventory(a["warehouse_id"]),
-        "list_warehouses_by_region": lambda a: list_warehouses_by_region(a["region"]),
-    }
-    handler = handlers.get(name)
+    handler = TOOL_DISPATCH.get(name)
     if not handler:
         raise ValueError(f"Unknown tool: {name}")
-    return _result(handler(arguments))
+    # boto3 senkron; DynamoDB RTT'si boyunca event loop'u bloklamasin
+    return _result(await asyncio.to_thread(handler, arguments))
 
 
 # --- Implementation ---
 
+def _redis_cached(key: str, loader):
+    """Redis read-through; Redis yoksa veya hata verirse dogrudan loader'a duser."""
+    if _redis is None:
+        return loader()
+    try:
+        raw = _redis.get(key)
+        # Eski surumlerin yazdigi "null" girdileri de miss sayilir
+        if raw is not None and raw != b"null":
+            return json.loads(raw)
+    except redis.RedisError:
+        pass
+    value = loader()
+    if value is None:
+        return value
+    try:
+        _redis.set(key, json.dumps(_to_json(value), ensure_ascii=False), ex=REDIS_TTL_SECONDS)
+    except redis.RedisError:
+        pass
+    return value
+
+
+def _all_items(operation, **kwargs) -> List[Dict]:
+    """query/scan sonucunu LastEvaluatedKey bitene kadar sayfalayip toplar (1 MB sayfa siniri)."""
+    resp = operation(**kwargs)
+    items = resp.get("Items", [])
+    while "LastEvaluatedKey" in resp:
+        resp = operation(**kwargs, ExclusiveStartKey=resp["LastEvaluatedKey"])
+        items.extend(resp.get("Items", []))
+    return items
+
+
 def get_inventory(warehouse_id: str, sku: str) -> Dict:
     try:
-        table = dynamodb.Table("Inventory")
-        resp = table.get_item(Key={"warehouse_id": warehouse_id, "sku": sku})
+        resp = INVENTORY_TBL.get_item(Key={"warehouse_id": warehouse_id, "sku": sku})
         if "Item" not in resp:
             return {"success": False, "error": "Inventory item not found"}
         return {"success": True, "data": resp["Item"]}
@@ -94,35 +163,39 @@ def get_inventory(warehouse_id: str, sku: str) -> Dict:
 
 def get_warehouse_info(warehouse_id: str) -> Dict:
     try:
-        table = dynamodb.Table("Warehouses")
-        resp = table.get_item(Key={"warehouse_id": warehouse_id})
-        if "Item" not in resp:
+        item = ttl_cache.get_or_load(_warehouse_cache, warehouse_id,
+                                     lambda: _redis_cached(f"wh:{warehouse_id}", lambda: WAREHOUSES_TBL.get_item(
+                                         Key={"warehouse_id": warehouse_id}).get("Item")),
+                                     WAREHOUSE_CACHE_TTL_SECONDS)
+        if item is None:
             return {"success": False, "error": "Warehouse not found"}
-        return {"success": True, "data": resp["Item"]}
+        return {"success": True, "data": item}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
 def list_warehouses() -> Dict:
     try:
-        table = dynamodb.Table("Warehouses")
-        resp = table.scan()
-        return {"success": True, "count": len(resp["Items"]), "data": resp["Items"]}
+        items = _all_items(WAREHOUSES_TBL.scan)
+        return {"success": True, "count": len(items), "data": items}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
 def list_low_stock_items(warehouse_id: str) -> Dict:
+    """Depo partition'i key ile sorgulanir, tablo taranmaz. Sparse low-stock GSI
+    kullanilmiyor: quantity'yi degistiren her yazici (transfer_ops, agentcore_app,
+    seed yukleyiciler) flag'i guncellemek zorunda kalir, unutulursa index bayatlar."""
     try:
-        from boto3.dynamodb.conditions import Key
-        table = dynamodb.Table("Inventory")
-        resp = table.query(KeyConditionExpression=Key("warehouse_id").eq(warehouse_id))
-        low_stock = []
-        for item in resp.get("Items", []):
-            qty = item.get("quantity", 0)
-            threshold = item.get("min_threshold", 0)
-            if threshold and qty < threshold:
-                low_stock.append(item)
+        from boto3.dynamodb.conditions import Key, Attr
+        # Karsilastirma DynamoDB tarafinda yapilir; esik altinda olmayan kayitlar donmez.
+        # quantity attribute'u olmayan kayitlar 0 sayilir (esik > 0 ise dusuk stok)
+        low_stock = _all_items(
+            INVENTORY_TBL.query,
+            KeyConditionExpression=Key("warehouse_id").eq(warehouse_id),
+            FilterExpression=Attr("min_threshold").gt(0)
+            & (Attr("quantity").lt(Attr("min_threshold")) | Attr("quantity").not_exists())
+        )
         low_stock.sort(key=lambda x: x.get("quantity", 0))
         return {"success": True, "count": len(low_stock), "data": low_stock}
     except Exception as e:
@@ -131,11 +204,13 @@ def list_low_stock_items(warehouse_id: str) -> Dict:
 
 def get_product_info(sku: str) -> Dict:
     try:
-        table = dynamodb.Table("Products")
-        resp = table.get_item(Key={"sku": sku})
-        if "Item" not in resp:
+        item = ttl_cache.get_or_load(_product_cache, sku,
+                                     lambda: _redis_cached(f"prod:{sku}", lambda: PRODUCTS_TBL.get_item(
+                                         Key={"sku": sku}).get("Item")),
+                                     PRODUCT_CACHE_TTL_SECONDS)
+        if item is None:
             return {"success": False, "error": "Product not found"}
-        return {"success": True, "data": resp["Item"]}
+        return {"success": True, "data": item}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
@@ -143,12 +218,12 @@ def get_product_info(sku: str) -> Dict:
 def list_products_by_category(category: str) -> Dict:
     try:
         from boto3.dynamodb.conditions import Key
-        table = dynamodb.Table("Products")
-        resp = table.query(
+        items = _all_items(
+            PRODUCTS_TBL.query,
             IndexName="CategoryIndex",
             KeyConditionExpression=Key("category").eq(category)
         )
-        return {"success": True, "count": len(resp["Items"]), "data": resp["Items"]}
+        return {"success": True, "count": len(items), "data": items}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
@@ -156,9 +231,8 @@ def list_products_by_category(category: str) -> Dict:
 def get_warehouse_inventory(warehouse_id: str) -> Dict:
     try:
         from boto3.dynamodb.conditions import Key
-        table = dynamodb.Table("Inventory")
-        resp = table.query(KeyConditionExpression=Key("warehouse_id").eq(warehouse_id))
-        return {"success": True, "count": len(resp["Items"]), "data": resp["Items"]}
+        items = _all_items(INVENTORY_TBL.query, KeyConditionExpression=Key("warehouse_id").eq(warehouse_id))
+        return {"success": True, "count": len(items), "data": items}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
@@ -167,15 +241,49 @@ def list_warehouses_by_region(region: str) -> Dict:
     """Warehouses tablosunda GSI yok, scan + filter kullaniyoruz."""
     try:
         from boto3.dynamodb.conditions import Attr
-        table = dynamodb.Table("Warehouses")
-        resp = table.scan(FilterExpression=Attr("region").eq(region))
-        return {"success": True, "count": len(resp["Items"]), "data": resp["Items"]}
+        items = _all_items(WAREHOUSES_TBL.scan, FilterExpression=Attr("region").eq(region))
+        return {"success": True, "count": len(items), "data": items}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def validate_transfer(source_warehouse_id: str, target_warehouse_id: str, sku: str, quantity: int) -> Dict:
+    """Transfer oncesi kontrol: miktar pozitif, depolar farkli, hedef depo mevcut,
+    kaynakta yeterli stok. Kaynak stok ve hedef depo tek BatchGetItem ile okunur."""
+    # Agent'tan gelen quantity sayi olmayabilir; karsilastirma TypeError atmasin
+    if not isinstance(quantity, int) or isinstance(quantity, bool):
+        return {"success": True, "valid": False, "reason": "quantity must be a positive integer"}
+    if quantity <= 0:
+        return {"success": True, "valid": False, "reason": "quantity must be positive"}
+    if source_warehouse_id == target_warehouse_id:
+        return {"success": True, "valid": False, "reason": "source and target must differ"}
+    try:
+        # Kontrol icin kaynakta sadece quantity, hedefte sadece varlik gerekiyor
+        request = {
+            "Inventory": {"Keys": [{"warehouse_id": source_warehouse_id, "sku": sku}],
+                          "ProjectionExpression": "#q", "ExpressionAttributeNames": {"#q": "quantity"}},
+        }
+        # Hedef depo cache'te ise varlik kontrolu icin DynamoDB'ye gitmeye gerek yok
+        cached, warehouse = ttl_cache.lookup(_warehouse_cache, target_warehouse_id)
+        if not cached:
+            request["Warehouses"] = {"Keys": [{"warehouse_id": target_warehouse_id}],
+                                     "ProjectionExpression": "warehouse_id"}
+        found = batch_get_with_backoff(dynamodb, request)
+        if cached:
+            found["Warehouses"] = [warehouse] if warehouse is not None else []
+
+        if not found["Warehouses"]:
+            return {"success": True, "valid": False, "reason": "Target warehouse not found"}
+        available = found["Inventory"][0].get("quantity", 0) if found["Inventory"] else 0
+        if available < quantity:
+            return {"success": True, "valid": False, "reason": "Insufficient stock",
+                    "available": available, "requested": quantity}
+        return {"success": True, "valid": True, "available": available, "requested": quantity}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
 if __name__ == "__main__":
-    import asyncio
     from mcp.server.stdio import stdio_server
 
     async def run():
@@ -53,6 +53,9 @@ class TransferCoordinatorAgent(BaseAgent):
         )
         # Stok verileri: {(warehouse_id, sku): quantity}
         self._stock: dict[tuple[str, str], int] = {}
+        # SKU indeksi: {sku: {warehouse_id: quantity}} - _stock ile senkron tutulur,
+        # SKU bazlı sorgular tüm (depo, sku) çiftlerini taramaz
+        self._stock_by_sku: dict[str, dict[str, int]] = {}
         # Transfer geçmişi
         self._transfers: list[TransferRequest] = []
         # Onay kuyruğu
@@ -64,7 +67,13 @@ class TransferCoordinatorAgent(BaseAgent):
 
     def set_stock(self, warehouse_id: str, sku: str, quantity: int) -> None:
         """Stok seviyesini ayarlar."""
-        self._stock[(warehouse_id, sku)] = quantity
+        self._put_stock((warehouse_id, sku), quantity)
+
+    def _put_stock(self, key: tuple[str, str], quantity: int) -> None:
+        """Stok seviyesini hem _stock'a hem SKU indeksine yazar."""
+        self._stock[key] = quantity
+        warehouse_id, sku = key
+        self._stock_by_sku.setdefault(sku, {})[warehouse_id] = quantity
 
     def get_stock(self, warehouse_id: str, sku: str) -> int:
         """Stok seviyesini döndürür."""
@@ -144,8 +153,8 @@ class TransferCoordinatorAgent(BaseAgent):
         """
         candidates: list[tuple[str, int, float]] = []
 
-        for (wh_id, s), qty in self._stock.items():
-            if s != sku or wh_id == target_warehouse_id:
+        for wh_id, qty in self._stock_by_sku.get(sku, {}).items():
+            if wh_id == target_warehouse_id:
                 continue
             safe_available = qty - safety_threshold
             if safe_available >= required_quantity:
@@ -349,14 +358,14 @@ class TransferCoordinatorAgent(BaseAgent):
 
         # Atomik güncelleme
         try:
-            self._stock[src_key] = source_stock - transfer.quantity
-            self._stock[tgt_key] = target_stock + transfer.quantity
+            self._put_stock(src_key, source_stock - transfer.quantity)
+            self._put_stock(tgt_key, target_stock + transfer.quantity)
 
             # Negatif stok kontrolü (invariant)
             if self._stock[src_key] < 0:
                 # Rollback
-                self._stock[src_key] = source_stock
-                self._stock[tgt_key] = target_stock
+                self._put_stock(src_key, source_stock)
+                self._put_stock(tgt_key, target_stock)
                 transfer.status = TransferStatus.ROLLED_BACK
                 self._transfers.append(transfer)
                 raise ValidationError("Negatif stok tespit edildi, rollback yapıldı")
@@ -389,8 +398,8 @@ class TransferCoordinatorAgent(BaseAgent):
 
         except Exception as e:
             # Rollback
-            self._stock[src_key] = source_stock
-            self._stock[tgt_key] = target_stock
+            self._put_stock(src_key, source_stock)
+            self._put_stock(tgt_key, target_stock)
             transfer.status = TransferStatus.ROLLED_BACK
             if transfer not in self._transfers:
                 self._transfers.append(transfer)
@@ -571,9 +580,7 @@ class TransferCoordinatorAgent(BaseAgent):
 
     def get_total_stock(self, sku: str) -> int:
         """Bir SKU'nun tüm depolardaki toplam stok miktarını döndürür."""
-        return sum(
-            qty for (_, s), qty in self._stock.items() if s == sku
-        )
+        return sum(self._stock_by_sku.get(sku, {}).values())
 
     def get_all_transfers(self) -> list[TransferRequest]:
         """Tüm transfer geçmişini döndürür."""
@@ -0,0 +1,42 @@
+"""infra/_agent_config runtime ARN okuyucusu icin unit testler."""
+
+import pytest
+
+from infra import _agent_config
+
+ARN = "arn:aws:bedrock-agentcore:us-west-2:123456789012:runtime/warehouse-abc"
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.delenv("AGENT_ARN", raising=False)
+    _agent_config._read_config_arn.cache_clear()
+    path = tmp_path / ".bedrock_agentcore.yaml"
+
+    def write(text):
+        path.write_text(text, encoding="utf-8")
+        return _agent_config.agent_runtime_arn(str(path))
+    return write
+
+
+class TestAgentRuntimeArn:
+
+    def test_plain_and_quoted_values(self, config):
+        assert config(f"bedrock_agentcore:\n  agent_runtime_arn: {ARN}\n") == ARN
+        _agent_config._read_config_arn.cache_clear()
+        assert config(f"bedrock_agentcore:\n  agent_runtime_arn: \"{ARN}\"\n") == ARN
+
+    def test_empty_value_does_not_read_next_line(self, config):
+        assert config("bedrock_agentcore:\n  agent_runtime_arn:\n  agent_id: abc\n") is None
+
+    @pytest.mark.parametrize("value", ["null", "~", "''"])
+    def test_null_values_are_missing(self, config, value):
+        assert config(f"bedrock_agentcore:\n  agent_runtime_arn: {value}\n") is None
+
+    def test_env_var_wins(self, config, monkeypatch):
+        monkeypatch.setenv("AGENT_ARN", ARN)
+        assert config("bedrock_agentcore:\n  agent_runtime_arn: null\n") == ARN
+
+    def test_missing_file(self, tmp_path, monkeypatch):
+        monkeypatch.delenv("AGENT_ARN", raising=False)
+        assert _agent_config.agent_runtime_arn(str(tmp_path / "missing.yaml")) is None
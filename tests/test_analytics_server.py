@@ -0,0 +1,176 @@
+"""Analytics MCP server yardimci fonksiyonlari icin unit testler (AWS gerektirmez)."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from data_layer import sales_cache
+from mcp_servers import analytics_server as analytics
+
+
+def _row(day, qty: float) -> dict:
+    return {"date_sku": f"{day.isoformat()}#SKU001", "quantity_sold": qty}
+
+
+class TestDailySeries:
+    """predict_demand'in gunluk takvim serisi."""
+
+    def test_same_day_sales_are_summed(self):
+        today = datetime.now().date()
+        series = analytics._daily_series([_row(today, 2.0), _row(today, 3.0)])
+        assert series == [5.0]
+
+    def test_gaps_and_trailing_days_are_zero_filled(self):
+        today = datetime.now().date()
+        rows = [_row(today - timedelta(days=10), 4.0), _row(today - timedelta(days=8), 6.0)]
+        series = analytics._daily_series(rows)
+        # Ilk satis gunuden bugune kadar her takvim gunu bir nokta
+        assert len(series) == 11
+        assert series[0] == 4.0 and series[2] == 6.0
+        assert series[1] == 0.0
+        assert series[3:] == [0.0] * 8
+
+
+class TestHoltForecast:
+    """Holt / SES talep tahmini."""
+
+    def test_constant_series_gives_flat_forecast(self):
+        total, resid_std = analytics._holt_forecast([5.0] * 30, 10)
+        assert total == pytest.approx(50.0)
+        assert resid_std == pytest.approx(0.0)
+
+    def test_linear_series_follows_trend(self):
+        n = 200
+        series = [2.0 + 0.5 * t for t in range(n)]
+        total, _ = analytics._holt_forecast(series, 3)
+        expected = sum(2.0 + 0.5 * (n - 1 + h) for h in (1, 2, 3))
+        assert total == pytest.approx(expected, rel=0.01)
+
+    def test_short_series_uses_ses_without_trend(self):
+        series = [1.0, 2.0, 3.0, 4.0, 5.0]
+        assert len(series) < analytics.HOLT_MIN_POINTS
+        one_day, _ = analytics._holt_forecast(series, 1)
+        three_days, _ = analytics._holt_forecast(series, 3)
+        # SES'te tahmin duz; trend yok
+        assert three_days == pytest.approx(3 * one_day)
+        assert one_day < series[-1]
+
+    def test_trailing_zero_days_pull_forecast_down(self):
+        active = [10.0] * 60
+        stale = active + [0.0] * 14
+        active_total, _ = analytics._holt_forecast(active, 7)
+        stale_total, _ = analytics._holt_forecast(stale, 7)
+        assert stale_total < active_total
+        assert stale_total >= 0.0
+
+    def test_forecast_is_never_negative(self):
+        total, _ = analytics._holt_forecast([float(x) for x in range(30, 0, -1)] + [0.0] * 30, 30)
+        assert total >= 0.0
+
+
+class TestConfidence:
+    def test_no_sales_is_low(self):
+        assert analytics._confidence(0.0, 0.0) == "low"
+
+    def test_thresholds_on_coefficient_of_variation(self):
+        assert analytics._confidence(1.0, 10.0) == "high"
+        assert analytics._confidence(7.0, 10.0) == "medium"
+        assert analytics._confidence(15.0, 10.0) == "low"
+
+
+class TestSalesDiskCache:
+    """Kapanmis aylarin satis disk cache'i ve VERSION ile gecersiz kilma."""
+
+    @pytest.fixture
+    def cache(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(sales_cache, "SALES_CACHE_DIR", str(tmp_path))
+        calls = []
+
+        def fake_range(warehouse_id, sku, start_str, end_str=None, fields=None):
+            calls.append((start_str, end_str))
+            if end_str:  # kapanmis aylar
+                return [{"date_sku": f"{start_str}#{sku}", "quantity_sold": 3}]
+            return [{"date_sku": f"{start_str}#{sku}", "quantity_sold": 1}]
+
+        monkeypatch.setattr(analytics, "_query_sales_range", fake_range)
+        return calls, sales_cache.bump_version
+
+    @staticmethod
+    def _month_start():
+        return datetime.now().strftime("%Y-%m-01")
+
+    @staticmethod
+    def _prev_month_start():
+        first = datetime.now().replace(day=1)
+        return (first - timedelta(days=1)).strftime("%Y-%m-01")
+
+    def test_closed_months_come_from_disk_current_month_live(self, cache):
+        calls, _ = cache
+        start = self._prev_month_start()
+        month_start = self._month_start()
+
+        first = analytics._query_sales("WH001", "SKU001", start)
+        second = analytics._query_sales("WH001", "SKU001", start)
+
+        assert first == second
+        # Ilk cagri: kapanmis aralik + bu ay; ikinci cagri: sadece bu ay
+        assert calls == [(start, month_start), (month_start, None), (month_start, None)]
+
+    def test_start_in_current_month_skips_cache(self, cache, tmp_path):
+        calls, _ = cache
+        month_start = self._month_start()
+        analytics._query_sales("WH001", "SKU001", month_start)
+        assert calls == [(month_start, None)]
+        assert not list(tmp_path.rglob("*.json"))
+
+    def test_version_bump_makes_entries_stale(self, cache):
+        calls, bump = cache
+        start = self._prev_month_start()
+        month_start = self._month_start()
+
+        analytics._query_sales("WH001", "SKU001", start)
+        bump()
+        calls.clear()
+        analytics._query_sales("WH001", "SKU001", start)
+
+        assert calls == [(start, month_start), (month_start, None)]
+
+    def test_version_bump_deletes_old_entries(self, cache, tmp_path):
+        _, bump = cache
+        analytics._query_sales("WH001", "SKU001", self._prev_month_start())
+        old_files = list(tmp_path.rglob("*.json"))
+        assert old_files
+
+        bump()
+
+        assert not any(f.exists() for f in old_files)
+        assert not list(tmp_path.rglob("*.json"))
+        assert (tmp_path / sales_cache.VERSION_FILE).exists()
+
+    def test_entry_from_previous_month_forces_refetch(self, cache):
+        calls, _ = cache
+        start = self._prev_month_start()
+        month_start = self._month_start()
+        version = sales_cache.read_version()
+        path = analytics._sales_cache_path(version, "WH001", "SKU001", None)
+        # Gecen ay yazilmis girdi: kapanan ay artik 'until' sinirinin icinde degil
+        analytics._write_sales_cache(path, {
+            "version": version, "from": start, "until": start, "items": [],
+        })
+
+        rows = analytics._query_sales("WH001", "SKU001", start)
+
+        assert calls == [(start, month_start), (month_start, None)]
+        assert [r["quantity_sold"] for r in rows] == [3, 1]
+
+    def test_earlier_start_than_cached_forces_refetch(self, cache):
+        calls, _ = cache
+        start = self._prev_month_start()
+        month_start = self._month_start()
+        analytics._query_sales("WH001", "SKU001", start)
+        calls.clear()
+
+        earlier = (datetime.fromisoformat(start) - timedelta(days=30)).strftime("%Y-%m-%d")
+        analytics._query_sales("WH001", "SKU001", earlier)
+
+        assert calls == [(earlier, month_start), (month_start, None)]
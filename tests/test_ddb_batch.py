@@ -0,0 +1,50 @@
+"""Ortak BatchGetItem yardimcisi icin unit testler (AWS gerektirmez)."""
+
+from mcp_servers import ddb_batch
+
+
+class _FakeDynamo:
+    """Sirayla verilen yanitlari donduren, istekleri kaydeden sahte client."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def batch_get_item(self, RequestItems):
+        self.requests.append(RequestItems)
+        return self.responses.pop(0)
+
+
+class TestBatchGetWithBackoff:
+
+    def test_responses_are_grouped_by_table(self):
+        client = _FakeDynamo([{"Responses": {"Inventory": [{"sku": "SKU001"}], "Warehouses": []}}])
+        request = {"Inventory": {"Keys": [{"sku": "SKU001"}]}, "Warehouses": {"Keys": [{"warehouse_id": "WH001"}]}}
+
+        found = ddb_batch.batch_get_with_backoff(client, request)
+
+        assert found == {"Inventory": [{"sku": "SKU001"}], "Warehouses": []}
+        assert len(client.requests) == 1
+
+    def test_unprocessed_keys_are_retried_with_jittered_backoff(self, monkeypatch):
+        sleeps = []
+        monkeypatch.setattr(ddb_batch.time, "sleep", sleeps.append)
+        retry = {"Products": {"Keys": [{"sku": "SKU002"}]}}
+        client = _FakeDynamo([
+            {"Responses": {"Products": [{"sku": "SKU001"}]}, "UnprocessedKeys": retry},
+            {"Responses": {"Products": []}, "UnprocessedKeys": retry},
+            {"Responses": {"Products": [{"sku": "SKU002"}]}, "UnprocessedKeys": {}},
+        ])
+
+        found = ddb_batch.batch_get_with_backoff(client, {"Products": {"Keys": [{"sku": "SKU001"}, {"sku": "SKU002"}]}})
+
+        assert found["Products"] == [{"sku": "SKU001"}, {"sku": "SKU002"}]
+        assert client.requests[1:] == [retry, retry]
+        base = ddb_batch.BACKOFF_BASE_SECONDS
+        assert base / 2 <= sleeps[0] <= base
+        assert base <= sleeps[1] <= 2 * base
+
+    def test_empty_request_makes_no_call(self):
+        client = _FakeDynamo([])
+        assert ddb_batch.batch_get_with_backoff(client, {}) == {}
+        assert client.requests == []
@@ -114,6 +114,19 @@ class TestSourceWarehouseSelection:
         source = agent.select_source_warehouse("SKU001", "WH001", 30)
         assert source is None
 
+    def test_selection_reflects_completed_transfers(self):
+        """SKU indeksi transfer sonrası güncel stoğu yansıtmalı."""
+        agent = _create_agent()
+        agent.set_stock("WH001", "SKU001", 100)
+        agent.set_stock("WH002", "SKU001", 90)
+        agent.set_stock("WH001", "SKU002", 500)
+
+        agent.execute_transfer("WH001", "WH003", "SKU001", 40)
+
+        assert agent.select_source_warehouse("SKU001", "WH003", 30) == "WH002"
+        assert agent.get_total_stock("SKU001") == 190
+        assert agent.get_total_stock("SKU002") == 500
+
 
 class TestTransferQuantityCalculation:
     """Gereksinim 2.3: Transfer miktarı hesaplama."""
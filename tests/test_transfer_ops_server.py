@@ -0,0 +1,63 @@
+"""Transfer Ops MCP server yardimci fonksiyonlari icin unit testler (AWS gerektirmez)."""
+
+import pytest
+
+from mcp_servers import transfer_ops_server as transfer_ops
+
+FIXED_MS = 1_760_000_000_000
+
+
+def _decode(chars: str) -> int:
+    value = 0
+    for c in chars:
+        value = value * 32 + transfer_ops._CROCKFORD32.index(c)
+    return value
+
+
+def _encode(ms: int, rand: int) -> str:
+    value = (ms << 80) | rand
+    chars = []
+    for _ in range(26):
+        value, idx = divmod(value, 32)
+        chars.append(transfer_ops._CROCKFORD32[idx])
+    return "".join(reversed(chars))
+
+
+@pytest.fixture
+def frozen_ms(monkeypatch):
+    """Saati sabit bir milisaniyede durdurur ve ULID durumunu sifirlar."""
+    monkeypatch.setattr(transfer_ops.time, "time_ns", lambda: FIXED_MS * 1_000_000)
+    monkeypatch.setattr(transfer_ops, "_ulid_last", (0, 0))
+    return FIXED_MS
+
+
+class TestNewId:
+    """ULID bicimli transfer/decision id'leri."""
+
+    def test_format_is_prefix_and_26_crockford_chars(self):
+        new_id = transfer_ops._new_id("TRF")
+        prefix, body = new_id.split("-", 1)
+        assert prefix == "TRF"
+        assert len(body) == 26
+        assert set(body) <= set(transfer_ops._CROCKFORD32)
+
+    def test_timestamp_prefix_decodes_to_ms(self, frozen_ms):
+        body = transfer_ops._new_id("DEC").split("-", 1)[1]
+        assert _decode(body[:10]) == frozen_ms
+
+    def test_strictly_increasing_within_same_ms(self, frozen_ms):
+        ids = [transfer_ops._new_id("TRF") for _ in range(1000)]
+        assert ids == sorted(ids)
+        assert len(set(ids)) == len(ids)
+        assert all(_decode(i.split("-", 1)[1][:10]) == frozen_ms for i in ids)
+
+    def test_random_part_overflow_carries_into_ms(self, frozen_ms, monkeypatch):
+        monkeypatch.setattr(transfer_ops, "_ulid_last", (frozen_ms, (1 << 80) - 1))
+        last = "TRF-" + _encode(frozen_ms, (1 << 80) - 1)
+
+        new_id = transfer_ops._new_id("TRF")
+        body = new_id.split("-", 1)[1]
+        assert new_id > last
+        assert _decode(body[:10]) == frozen_ms + 1
+        assert _decode(body[10:]) == 0
+        assert transfer_ops._ulid_last == (frozen_ms + 1, 0)
@@ -0,0 +1,80 @@
+"""MCP server'larinin paylasilan TTL cache yardimcilari icin unit testler."""
+
+import pytest
+
+from mcp_servers import ttl_cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+class TestTtlCache:
+    """Process ici depo/urun cache'i."""
+
+    def test_hit_within_ttl_skips_loader(self):
+        cache = {}
+        calls = []
+        loader = lambda: calls.append(1) or {"id": "WH001"}
+
+        first = ttl_cache.get_or_load(cache, "WH001", loader, 60)
+        second = ttl_cache.get_or_load(cache, "WH001", loader, 60)
+
+        assert first == second == {"id": "WH001"}
+        assert len(calls) == 1
+
+    def test_expired_entry_is_reloaded(self, clock):
+        cache = {}
+        ttl_cache.put(cache, "SKU001", {"sku": "SKU001"}, 60)
+
+        clock[0] += 61
+        assert ttl_cache.lookup(cache, "SKU001") == (False, None)
+
+    def test_miss_is_cached_only_briefly(self, clock):
+        cache = {}
+        ttl_cache.put(cache, "WH999", None, 300)
+
+        assert ttl_cache.lookup(cache, "WH999") == (True, None)
+        clock[0] += ttl_cache.MISS_TTL_SECONDS + 1
+        assert ttl_cache.lookup(cache, "WH999") == (False, None)
+
+
+class TestEviction:
+    """Dolu cache toptan silinmez."""
+
+    def test_expired_entries_are_evicted_first(self, clock, monkeypatch):
+        monkeypatch.setattr(ttl_cache, "MAX_ENTRIES", 4)
+        cache = {}
+        ttl_cache.put(cache, "old", 1, 10)
+        for key in ("a", "b", "c"):
+            ttl_cache.put(cache, key, key, 600)
+
+        clock[0] += 11
+        ttl_cache.put(cache, "d", "d", 600)
+
+        assert list(cache) == ["a", "b", "c", "d"]
+
+    def test_oldest_entries_are_evicted_when_nothing_expired(self, monkeypatch):
+        monkeypatch.setattr(ttl_cache, "MAX_ENTRIES", 10)
+        cache = {}
+        for i in range(10):
+            ttl_cache.put(cache, i, i, 600)
+
+        ttl_cache.put(cache, 10, 10, 600)
+
+        # Sadece en eski girdi atilir; diger sicak girdiler kalir
+        assert list(cache) == list(range(1, 11))
+
+    def test_rewritten_key_counts_as_newest(self, monkeypatch):
+        monkeypatch.setattr(ttl_cache, "MAX_ENTRIES", 3)
+        cache = {}
+        for key in ("a", "b", "c"):
+            ttl_cache.put(cache, key, key, 600)
+        ttl_cache.put(cache, "a", "a2", 600)
+
+        ttl_cache.put(cache, "d", "d", 600)
+
+        assert list(cache) == ["c", "a", "d"]